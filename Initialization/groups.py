@@ -0,0 +1,143 @@
+import json
+import random
+
+# RFC 2409 / RFC 3526 MODP groups. Each prime is
+#   p = 2^n - 2^(n-64) - 1 + 2^64 * (floor(2^(n-130) * pi) + offset)
+# a safe prime (q = (p-1)/2 is prime) with generator 2, which generates the
+# subgroup of order q. Stored as (bits, offset) and expanded on first use.
+MODP_GROUPS = {
+    'modp1024': (1024, 129093),     # RFC 2409 group 2
+    'modp1536': (1536, 741804),     # RFC 3526 group 5
+    'modp2048': (2048, 124476),     # RFC 3526 group 14
+    'modp3072': (3072, 1690314),    # RFC 3526 group 15
+    'modp4096': (4096, 240904),     # RFC 3526 group 16
+    'modp6144': (6144, 929484),     # RFC 3526 group 17
+    'modp8192': (8192, 4743158),    # RFC 3526 group 18
+}
+DEFAULT_GROUP = 'modp2048'
+
+_SMALL_PRIMES = [p for p in range(3, 1000) if all(p % d for d in range(2, int(p ** 0.5) + 1))]
+# private RNG for Miller-Rabin bases: never disturbs the seeded global `random`
+_rng = random.Random(3526)
+_group_cache = {}
+
+
+def is_probable_prime(n, rounds=32):
+    """Miller-Rabin test (trial division by small primes first)."""
+    if n < 2:
+        return False
+    if n in (2, 3):
+        return True
+    if n % 2 == 0:
+        return False
+    for sp in _SMALL_PRIMES:
+        if n % sp == 0:
+            return n == sp
+    d, s = n - 1, 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for _ in range(rounds):
+        a = _rng.randrange(2, n - 1)
+        x = pow(a, d, n)
+        if x in (1, n - 1):
+            continue
+        for _ in range(s - 1):
+            x = pow(x, 2, n)
+            if x == n - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _pi_fixed(bits):
+    """floor(pi * 2^bits), via Machin's formula in integer arithmetic."""
+    guard = 32
+    one = 1 << (bits + guard)
+
+    def arctan_inv(x):
+        total = term = one // x
+        x2, k, sign = x * x, 1, -1
+        while term:
+            term //= x2
+            k += 2
+            total += sign * (term // k)
+            sign = -sign
+        return total
+
+    return (16 * arctan_inv(5) - 4 * arctan_inv(239)) >> guard
+
+
+def _modp_prime(bits, offset):
+    return (1 << bits) - (1 << (bits - 64)) - 1 + (1 << 64) * (_pi_fixed(bits - 130) + offset)
+
+
+def make_group(p, g=None, name=None, verify=True, rounds=32):
+    """
+    Build a group dict {'name', 'p', 'q', 'g', 'bits'} for safe prime p.
+    With verify=True, q = (p-1)/2 is Miller-Rabin tested (`rounds` bases) and p
+    is then proven prime by Pocklington's criterion (2^(p-1) = 1 mod p, one
+    modexp); g must have order q (g != 1 and g^q = 1 mod p). When g is None the
+    smallest generator of the order-q subgroup (2 or 4) is chosen.
+    """
+    q = (p - 1) // 2
+    if verify and not (p % 3 and is_probable_prime(q, rounds) and pow(2, p - 1, p) == 1):
+        raise ValueError(f"group {name or p}: p is not a safe prime")
+    if g is None:
+        g = 2 if pow(2, q, p) == 1 else 4
+    if verify and (g % p in (0, 1, p - 1) or pow(g, q, p) != 1):
+        raise ValueError(f"group {name or p}: g={g} does not generate the order-q subgroup")
+    return {'name': name, 'p': p, 'q': q, 'g': g, 'bits': p.bit_length()}
+
+
+def get_group(name=DEFAULT_GROUP, path=None, verify=True, rounds=None):
+    """
+    Return a verified group by name: one of MODP_GROUPS, or an entry of the
+    JSON table at `path` (see load_groups). Results are cached per process,
+    so the primality checks run once. The published RFC primes get a quick
+    check (2 Miller-Rabin rounds on q) by default, groups read from disk 32.
+    """
+    key = (name, path)
+    if key in _group_cache:
+        return _group_cache[key]
+    if path is not None:
+        groups = load_groups(path, verify=verify, rounds=32 if rounds is None else rounds)
+        if name not in groups:
+            raise KeyError(f"group {name!r} not found in {path}")
+        group = groups[name]
+    else:
+        if name not in MODP_GROUPS:
+            raise KeyError(f"unknown group {name!r}; choose from {sorted(MODP_GROUPS)}")
+        bits, offset = MODP_GROUPS[name]
+        group = make_group(_modp_prime(bits, offset), 2, name=name, verify=verify,
+                           rounds=2 if rounds is None else rounds)
+    _group_cache[key] = group
+    return group
+
+
+def load_groups(path, verify=True, rounds=32):
+    """
+    Load groups from a JSON file of the form
+      {"name": {"p": "<hex>" or int, "g": int (optional)}, ...}
+    Every entry is verified unless verify=False.
+    """
+    with open(path) as f:
+        raw = json.load(f)
+    groups = {}
+    for name, entry in raw.items():
+        p = entry['p']
+        if isinstance(p, str):
+            p = int(p, 16)
+        groups[name] = make_group(p, entry.get('g'), name=name, verify=verify, rounds=rounds)
+    return groups
+
+
+def save_groups(path, names=None):
+    """Write the named (default: all) built-in groups to a JSON table."""
+    table = {}
+    for name in names or MODP_GROUPS:
+        group = get_group(name)
+        table[name] = {'p': format(group['p'], 'x'), 'g': group['g']}
+    with open(path, 'w') as f:
+        json.dump(table, f, indent=2)
@@ -0,0 +1,126 @@
+# Initialization/neighbor_index.py
+import math
+from collections import defaultdict
+
+
+class NeighborIndex:
+    """
+    Uniform grid over node positions used for range queries.
+
+    The grid cell size equals the transmission range, so every node within
+    `radius <= cell_size` of a point lies in the 3x3 block of cells around it.
+    A query therefore costs O(local density) instead of O(n).
+
+    positions: dict node_id -> (x, y) (may include the sink)
+    cell_size: grid cell edge length, normally the network transmission_range
+    """
+
+    def __init__(self, positions, cell_size):
+        self.cell_size = float(cell_size) if cell_size and cell_size > 0 else 1.0
+        self.positions = {}
+        self.cells = defaultdict(set)
+        # bumped on every structural change so dependent caches can detect staleness
+        self.version = 0
+        for node_id, pos in positions.items():
+            self.add(node_id, pos)
+
+    def _cell(self, pos):
+        return (int(math.floor(pos[0] / self.cell_size)), int(math.floor(pos[1] / self.cell_size)))
+
+    def __contains__(self, node_id):
+        return node_id in self.positions
+
+    def __len__(self):
+        return len(self.positions)
+
+    def add(self, node_id, pos):
+        if node_id in self.positions:
+            self.remove(node_id)
+        self.positions[node_id] = pos
+        self.cells[self._cell(pos)].add(node_id)
+        self.version += 1
+
+    def remove(self, node_id):
+        """Drop a node (e.g. when it dies). Unknown ids are ignored."""
+        pos = self.positions.pop(node_id, None)
+        if pos is None:
+            return
+        cell = self._cell(pos)
+        members = self.cells.get(cell)
+        if members is not None:
+            members.discard(node_id)
+            if not members:
+                del self.cells[cell]
+        self.version += 1
+
+    def move(self, node_id, new_pos):
+        """Update a node's position, relocating it to a new cell only if needed."""
+        old = self.positions.get(node_id)
+        if old is None:
+            self.add(node_id, new_pos)
+            return
+        old_cell, new_cell = self._cell(old), self._cell(new_pos)
+        self.positions[node_id] = new_pos
+        if old_cell != new_cell:
+            self.cells[old_cell].discard(node_id)
+            if not self.cells[old_cell]:
+                del self.cells[old_cell]
+            self.cells[new_cell].add(node_id)
+        self.version += 1
+
+    def query(self, pos, radius, exclude=None):
+        """
+        Return [(node_id, dist)] for all indexed nodes within `radius` of `pos`.
+        `exclude` is an optional node id (or set of ids) to leave out.
+        """
+        if exclude is None:
+            excluded = ()
+        elif isinstance(exclude, (set, frozenset, list, tuple)):
+            excluded = exclude
+        else:
+            excluded = (exclude,)
+        reach = max(1, int(math.ceil(radius / self.cell_size)))
+        cx, cy = self._cell(pos)
+        px, py = pos
+        result = []
+        for gx in range(cx - reach, cx + reach + 1):
+            for gy in range(cy - reach, cy + reach + 1):
+                members = self.cells.get((gx, gy))
+                if not members:
+                    continue
+                for node_id in members:
+                    if node_id in excluded:
+                        continue
+                    x, y = self.positions[node_id]
+                    d = math.hypot(px - x, py - y)
+                    if d <= radius:
+                        result.append((node_id, d))
+        return result
+
+    def neighbors(self, node_id, radius):
+        """Ids of nodes within `radius` of node `node_id` (excluding itself)."""
+        return [nid for nid, _ in self.query(self.positions[node_id], radius, exclude=node_id)]
+
+    def count(self, pos, radius, exclude=None):
+        return len(self.query(pos, radius, exclude=exclude))
+
+
+def get_neighbor_index(sink, all_nodes, radius=None):
+    """
+    Return the NeighborIndex attached to the sink by initialize_network, building
+    (and attaching) one from `all_nodes` if the network was created elsewhere.
+    """
+    index = getattr(sink, 'neighbor_index', None)
+    if index is not None:
+        return index
+    if radius is None:
+        radius = max((getattr(n, 'communication_radius', 0) or 0) for n in all_nodes.values()) if all_nodes else 1.0
+    positions = {nid: n.location for nid, n in all_nodes.items()}
+    if getattr(sink, 'node_id', None) is not None:
+        positions[sink.node_id] = sink.location
+    index = NeighborIndex(positions, radius)
+    try:
+        sink.neighbor_index = index
+    except Exception:
+        pass
+    return index
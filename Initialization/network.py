@@ -1,19 +1,142 @@
+import math
 import numpy as np
 import networkx as nx
 import random
-from sympy import isprime, nextprime
 from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
-from Initialization.nodeStructure import SensorNode, SinkNode
+from Initialization.nodeStructure import SensorNode, SinkNode, NodeStore
 from Initialization.routing_path import initialize_routing
+from Initialization.neighbor_index import NeighborIndex
+from Initialization.groups import get_group, DEFAULT_GROUP
+from Initialization.sim_log import get_logger
 
-def initialize_network(num_nodes=20, area_size=100, E0=100, theta=0.5, transmission_range=30, seed=None):
+logger = get_logger('network')
+
+
+def max_hop_calculator(n):
+    # PPK["f"]; module level so the PPK (and a network snapshot) can be pickled
+    return int(math.log2(n)) + 1
+
+
+def place_nodes(predefined_positions, num_nodes, area_size, transmission_range,
+                max_attempts_per_node=200, batch_size=20):
+    """
+    Place nodes len(predefined_positions)..num_nodes-1 so that each new node has
+    at least 2 already-placed neighbors within transmission_range (best-effort).
+
+    Candidates are drawn and scored `batch_size` at a time. A coarse occupancy
+    grid with cell edge trange/sqrt(2) (any two points in one cell are in range)
+    accepts most candidates of a batch with one array lookup; only candidates in
+    sparse cells are counted exactly through a cell list (NeighborIndex).
+    Every batch of uniform candidates that fails is followed by a batch placed
+    near random existing nodes (within trange/2), as before.
+    Returns dict node_id -> (int x, int y) for the newly placed nodes.
+    """
+    placed = np.empty((num_nodes, 2), dtype=float)
+    n = len(predefined_positions)
+    placed[:n] = np.asarray(predefined_positions, dtype=float)
+
+    cell = transmission_range / np.sqrt(2.0)
+    grid_dim = int(np.ceil(area_size / cell)) + 1
+    occupancy = np.zeros((grid_dim, grid_dim), dtype=np.int32)
+
+    def cells_of(pts):
+        idx = np.floor(pts / cell).astype(np.int64)
+        return np.clip(idx, 0, grid_dim - 1)
+
+    cx, cy = cells_of(placed[:n]).T
+    np.add.at(occupancy, (cx, cy), 1)
+
+    # exact counts for candidates in sparse cells come from a cell list
+    exact_index = NeighborIndex({j: tuple(placed[j]) for j in range(n)}, transmission_range)
+
+    def first_valid(cands):
+        cx, cy = cells_of(cands).T
+        dense = occupancy[cx, cy] >= 2
+        for k in range(cands.shape[0]):
+            if dense[k] or exact_index.count(tuple(cands[k]), transmission_range) >= 2:
+                return cands[k]
+        return None
+
+    new_positions = {}
+    rounds = max(1, max_attempts_per_node // batch_size)
+    for i in range(n, num_nodes):
+        chosen = None
+        for _ in range(rounds):
+            cands = np.random.uniform(0, area_size, size=(batch_size, 2))
+            chosen = first_valid(cands)
+            if chosen is not None:
+                break
+            # fallback: candidates near random existing nodes within trange/2
+            base = placed[np.random.randint(0, n, size=batch_size)]
+            angle = np.random.uniform(0, 2 * np.pi, size=batch_size)
+            radius = np.random.uniform(1, transmission_range / 2.0, size=batch_size)
+            cands = base + np.column_stack((radius * np.cos(angle), radius * np.sin(angle)))
+            # clamp into area
+            cands = np.clip(cands, 0.0, area_size)
+            chosen = first_valid(cands)
+            if chosen is not None:
+                break
+        # if we failed to find a spot with >=2 neighbors after many attempts,
+        # accept a uniform random position (best-effort) to avoid infinite loops
+        if chosen is None:
+            chosen = np.random.uniform(0, area_size, size=2)
+        pos = (int(chosen[0]), int(chosen[1]))
+        new_positions[i] = pos
+        placed[n] = pos
+        exact_index.add(i, pos)
+        gx, gy = cells_of(placed[n:n + 1])[0]
+        occupancy[gx, gy] += 1
+        n += 1
+    return new_positions
+
+
+def build_edges(coords, transmission_range, block_size=1024):
+    """
+    Return an (m, 2) array of index pairs (i < j) whose points in `coords`
+    (an (n, 2) array) lie within transmission_range of each other.
+
+    Points are sorted by x so each block of rows is only compared against the
+    columns whose x lies within transmission_range (sweep + blocked distances);
+    memory stays bounded by block_size * window.
+    """
+    coords = np.asarray(coords, dtype=float)
+    n = coords.shape[0]
+    if n < 2:
+        return np.empty((0, 2), dtype=np.int64)
+    order = np.argsort(coords[:, 0], kind='stable')
+    xs = coords[order, 0]
+    ys = coords[order, 1]
+    r2 = float(transmission_range) ** 2
+    pairs = []
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        hi = int(np.searchsorted(xs, xs[stop - 1] + transmission_range, side='right'))
+        dx = xs[start:stop, None] - xs[None, start:hi]
+        dy = ys[start:stop, None] - ys[None, start:hi]
+        within = (dx * dx + dy * dy) <= r2
+        # keep only the upper triangle (sorted column index > sorted row index)
+        rows, cols = np.nonzero(within)
+        rows += start
+        cols += start
+        keep = cols > rows
+        if keep.any():
+            pairs.append(np.column_stack((order[rows[keep]], order[cols[keep]])))
+    if not pairs:
+        return np.empty((0, 2), dtype=np.int64)
+    edges = np.concatenate(pairs)
+    edges.sort(axis=1)
+    return edges
+
+
+def initialize_network(num_nodes=20, area_size=100, E0=100, theta=0.5, transmission_range=30, seed=None,
+                       group=DEFAULT_GROUP, group_path=None, sink_private_key=None):
     # If seed is provided (int), use it to make runs reproducible.
     # If seed is None (default) do not reseed the RNG so each run differs.
     if seed is not None:
         np.random.seed(seed)
-        # also seed the stdlib random module used elsewhere for primes, etc.
+        # also seed the stdlib random module used by relay queries, etc.
         random.seed(seed)
     predefined_positions = [
         (10, 20), (20, 35), (76, 75), (40, 30), (50, 55),
@@ -35,54 +158,12 @@ def initialize_network(num_nodes=20, area_size=100, E0=100, theta=0.5, transmiss
         for i, p in enumerate(predefined_positions):
             positions[i] = p
 
-        # helper: count neighbors within transmission_range among current positions
-        def neighbor_count(candidate, existing_positions, trange):
-            import math
-            cnt = 0
-            cx, cy = candidate
-            for _, (x, y) in existing_positions.items():
-                if math.hypot(cx - x, cy - y) <= trange:
-                    cnt += 1
-            return cnt
-
-        # generate remaining positions with retries to ensure at least 2 neighbors
-        max_attempts_per_node = 200
-        for i in range(len(predefined_positions), num_nodes):
-            placed = False
-            attempts = 0
-            while not placed and attempts < max_attempts_per_node:
-                attempts += 1
-                cand = (float(np.random.uniform(0, area_size)), float(np.random.uniform(0, area_size)))
-                # require that the candidate has >=2 neighbors among already placed nodes
-                if neighbor_count(cand, positions, transmission_range) >= 2:
-                    positions[i] = (int(cand[0]), int(cand[1]))
-                    placed = True
-                    break
-                # if not enough neighbors yet, as a fallback allow placement near an existing node
-                if attempts % 20 == 0:
-                    # pick a random existing node and place candidate near it within trange/2
-                    import math, random as _rnd
-                    base_idx = _rnd.choice(list(positions.keys()))
-                    bx, by = positions[base_idx]
-                    angle = _rnd.uniform(0, 2 * math.pi)
-                    radius = _rnd.uniform(1, transmission_range / 2.0)
-                    cand = (bx + radius * math.cos(angle), by + radius * math.sin(angle))
-                    # clamp into area
-                    cand = (max(0.0, min(area_size, cand[0])), max(0.0, min(area_size, cand[1])))
-                    if neighbor_count(cand, positions, transmission_range) >= 2:
-                        positions[i] = (int(cand[0]), int(cand[1]))
-                        placed = True
-                        break
-
-            # if we failed to find a spot with >=2 neighbors after many attempts,
-            # accept the last candidate (best-effort) to avoid infinite loops
-            if not placed:
-                # final fallback: place uniformly at random and accept it
-                cand = (int(np.random.uniform(0, area_size)), int(np.random.uniform(0, area_size)))
-                positions[i] = cand
+        positions.update(place_nodes(predefined_positions, num_nodes, area_size, transmission_range))
 
     G = nx.Graph()
     sensor_nodes = {}
+    # numeric per-node state is held column-wise; SensorNode objects are views
+    node_store = NodeStore(capacity=len(positions))
 
     for node_id, pos in positions.items():
         initial_energy = np.random.uniform(E0, (1 + theta) * E0)
@@ -91,7 +172,7 @@ def initialize_network(num_nodes=20, area_size=100, E0=100, theta=0.5, transmiss
         # neighbor discovery is consistent with how graph edges are constructed
         # (edges use transmission_range). If desired we can add small jitter.
         communication_radius = transmission_range
-        sensor_node = SensorNode(node_id, pos, initial_energy, communication_radius)
+        sensor_node = SensorNode(node_id, pos, initial_energy, communication_radius, store=node_store)
         # If this node is at location (65, 70) mark it malicious by default
         # (user-requested). Set both 'malicious' and 'is_malicious' to keep
         # compatibility with different modules.
@@ -102,14 +183,16 @@ def initialize_network(num_nodes=20, area_size=100, E0=100, theta=0.5, transmiss
             sensor_node.malicious_behavior = 'no_response'
             # no scheduled delayed response by default
             sensor_node.malicious_response_delay = None
-            print(f"Marked node {node_id} at {pos} as malicious (behavior=no_response)")
+            logger.info("Marked node %s at %s as malicious (behavior=no_response)", node_id, pos)
         sensor_nodes[node_id] = sensor_node
         G.add_node(node_id, pos=pos, energy=initial_energy, radius=communication_radius)
-    for i in range(num_nodes):
-        for j in range(i + 1, num_nodes):
-            if np.linalg.norm(np.array(positions[i]) - np.array(positions[j])) <= transmission_range:
-                G.add_edge(i, j)
-    sink_location = (80, 80)  
+    sink_location = (80, 80)
+    # vectorized edge construction, emitted in one bulk add_edges_from
+    coords = np.array([positions[i] for i in range(num_nodes)], dtype=float).reshape(-1, 2)
+    G.add_edges_from(build_edges(coords, transmission_range).tolist())
+    # one shared neighbor index (sensor nodes + sink) queried by routing, relay
+    # selection and anomaly reporting instead of brute-force distance scans
+    neighbor_index = NeighborIndex(positions, transmission_range)
     sink_node = SinkNode(location=sink_location)
     # set the canonical node_id used across the codebase
     sink_node.node_id = 'sink'
@@ -118,16 +201,23 @@ def initialize_network(num_nodes=20, area_size=100, E0=100, theta=0.5, transmiss
     sink_node.communication_radius = transmission_range
     G.add_node(sink_node.node_id, pos=sink_node.location)
     positions[sink_node.node_id] = sink_node.location
-    for node_id, node in sensor_nodes.items():
-        dist = np.linalg.norm(np.array(node.location) - np.array(sink_location))
-        if dist <= transmission_range:  # within communication range
-            G.add_edge('sink', node_id)
-
-    private_key = rsa.generate_private_key(
-        public_exponent=65537,
-        key_size=2048,
-        backend=default_backend()
-    )
+    if num_nodes:
+        sink_dist = np.hypot(coords[:, 0] - sink_location[0], coords[:, 1] - sink_location[1])
+        # within communication range
+        G.add_edges_from(('sink', int(i)) for i in np.flatnonzero(sink_dist <= transmission_range))
+    neighbor_index.add(sink_node.node_id, sink_location)
+    sink_node.neighbor_index = neighbor_index
+    sink_node.node_store = node_store
+
+    # reuse the caller's sink key (e.g. from setup_cache.load_or_create_sink_key)
+    # instead of generating a fresh 2048-bit RSA key every run
+    private_key = sink_private_key
+    if private_key is None:
+        private_key = rsa.generate_private_key(
+            public_exponent=65537,
+            key_size=2048,
+            backend=default_backend()
+        )
     public_key = private_key.public_key()
     sink_node.private_key = private_key
     sink_node.public_key = public_key
@@ -135,24 +225,9 @@ def initialize_network(num_nodes=20, area_size=100, E0=100, theta=0.5, transmiss
     λ = 0.5
     hash_function = hashes.SHA256()
 
-    def max_hop_calculator(n):
-        import math
-        return int(math.log2(n)) + 1
-
-    def generate_large_prime(bits=256):
-        prime = random.getrandbits(bits)
-        while not isprime(prime):
-            prime = nextprime(prime)
-        return prime
-
-    def generate_generator(q):
-        for g in range(2, q):
-            if pow(g, 2, q) != 1:
-                return g
-        return 2
-
-    q = generate_large_prime()
-    g = generate_generator(q)
+    # G_q: order-q subgroup of a safe-prime MODP group (RFC 3526 by default, or a
+    # named entry of the JSON table at group_path); g generates it
+    modp = get_group(group, path=group_path)
 
     PPK = {
         "Los": sink_location,
@@ -160,8 +235,9 @@ def initialize_network(num_nodes=20, area_size=100, E0=100, theta=0.5, transmiss
         "f": max_hop_calculator,
         "λ": λ,
         "H": hash_function.name,
-        "Gq": q,
-        "g": g
+        "Gq": modp['p'],
+        "q": modp['q'],
+        "g": modp['g']
     }
 
     sink_node.SM = {
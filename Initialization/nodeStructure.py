@@ -1,20 +1,171 @@
+import numpy as np
+
+
+class NodeStore:
+    """
+    Structure-of-arrays storage for per-node state.
+
+    Positions, energy, radius, reputation, counters and malicious flags live in
+    NumPy arrays indexed by a slot number; `index` maps node_id -> slot and
+    `ids` maps slot -> node_id. SensorNode objects are thin views onto one slot,
+    so bulk updates (energy, reputation) and snapshots can run as array
+    operations over `store.energy[:store.size]` etc.
+    """
+
+    def __init__(self, capacity=16):
+        capacity = max(1, int(capacity))
+        self.size = 0
+        self.ids = []
+        self.index = {}
+        self.positions = np.zeros((capacity, 2), dtype=np.float64)
+        self.energy = np.zeros(capacity, dtype=np.float64)
+        self.radius = np.zeros(capacity, dtype=np.float64)
+        self.reputation = np.ones(capacity, dtype=np.float64)
+        self.anomaly_count = np.ones(capacity, dtype=np.int64)
+        self.suspicious_count = np.zeros(capacity, dtype=np.int64)
+        self.malicious = np.zeros(capacity, dtype=bool)
+        self.is_malicious = np.zeros(capacity, dtype=bool)
+
+    _ARRAYS = ('positions', 'energy', 'radius', 'reputation', 'anomaly_count',
+               'suspicious_count', 'malicious', 'is_malicious')
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        capacity = 2 * self.energy.shape[0]
+        for name in self._ARRAYS:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            if name == 'reputation':
+                new[:] = 1.0
+            elif name == 'anomaly_count':
+                new[:] = 1
+            new[:old.shape[0]] = old
+            setattr(self, name, new)
+
+    def allocate(self, node_id, location, energy, radius, is_malicious=False):
+        """Reserve a slot for node_id with the SensorNode defaults; returns the slot."""
+        if self.size == self.energy.shape[0]:
+            self._grow()
+        slot = self.size
+        self.size += 1
+        self.ids.append(node_id)
+        self.index[node_id] = slot
+        self.positions[slot] = location
+        self.energy[slot] = energy
+        self.radius[slot] = radius
+        self.is_malicious[slot] = bool(is_malicious)
+        return slot
+
+    def slots(self, node_ids):
+        return np.fromiter((self.index[n] for n in node_ids), dtype=np.int64)
+
+    def consume_energy(self, node_ids, amount):
+        """Vectorized SensorNode.consume_energy for many nodes (floor at 0)."""
+        idx = self.slots(node_ids)
+        self.energy[idx] = np.maximum(0.0, self.energy[idx] - amount)
+
+    def set_reputation(self, node_ids, values):
+        self.reputation[self.slots(node_ids)] = values
+
+    def distances_to(self, location):
+        """Distance from every stored node to `location` (array of length size)."""
+        pos = self.positions[:self.size]
+        return np.hypot(pos[:, 0] - location[0], pos[:, 1] - location[1])
+
+
 class SensorNode:
-    def __init__(self, node_id, location, initial_energy, communication_radius,is_malicious=False):
+    __slots__ = ('node_id', '_location', '_store', '_idx', 'routing_paths',
+                 'last_received_message', 'last_broadcast_time', 'forwarded',
+                 'last_sent_time', 'tamper_message', 'frwd_data_cnt', 'P',
+                 'malicious_behavior', 'malicious_response_delay', 'pending_delivery')
+
+    def __init__(self, node_id, location, initial_energy, communication_radius,is_malicious=False, store=None):
+        # numeric state lives in a NodeStore (shared by the network when given)
+        if store is None:
+            store = NodeStore(capacity=1)
+        self._store = store
+        self._idx = store.allocate(node_id, location, initial_energy, communication_radius, is_malicious)
         self.node_id = node_id
-        self.location = location
-        self.initial_energy = initial_energy
-        self.communication_radius = communication_radius
+        self._location = location
         self.routing_paths = []
-        self.reputation = 1.0
-        self.anomaly_count = 1
-        self.suspicious_count = 0
-        self.is_malicious = is_malicious
         self.last_received_message = None
         self.last_broadcast_time = None
         self.forwarded = True
         self.last_sent_time= {}
         self.tamper_message = False
+        # (scheduler, handle) of the delivery still in flight to this node, if any
+        self.pending_delivery = None
+
+    @property
+    def store(self):
+        return self._store
+
+    @property
+    def location(self):
+        return self._location
+
+    @location.setter
+    def location(self, value):
+        self._location = value
+        self._store.positions[self._idx] = value
+
+    @property
+    def initial_energy(self):
+        return float(self._store.energy[self._idx])
+
+    @initial_energy.setter
+    def initial_energy(self, value):
+        self._store.energy[self._idx] = value
+
+    @property
+    def communication_radius(self):
+        return float(self._store.radius[self._idx])
+
+    @communication_radius.setter
+    def communication_radius(self, value):
+        self._store.radius[self._idx] = value
+
+    @property
+    def reputation(self):
+        return float(self._store.reputation[self._idx])
+
+    @reputation.setter
+    def reputation(self, value):
+        self._store.reputation[self._idx] = value
+
+    @property
+    def anomaly_count(self):
+        return int(self._store.anomaly_count[self._idx])
+
+    @anomaly_count.setter
+    def anomaly_count(self, value):
+        self._store.anomaly_count[self._idx] = value
+
+    @property
+    def suspicious_count(self):
+        return int(self._store.suspicious_count[self._idx])
+
+    @suspicious_count.setter
+    def suspicious_count(self, value):
+        self._store.suspicious_count[self._idx] = value
+
+    @property
+    def malicious(self):
+        return bool(self._store.malicious[self._idx])
+
+    @malicious.setter
+    def malicious(self, value):
+        self._store.malicious[self._idx] = bool(value)
+
+    @property
+    def is_malicious(self):
+        return bool(self._store.is_malicious[self._idx])
 
+    @is_malicious.setter
+    def is_malicious(self, value):
+        self._store.is_malicious[self._idx] = bool(value)
 
     def __repr__(self):
         return (f"SensorNode(id={self.node_id}, location={self.location}, "
@@ -24,7 +175,7 @@ class SensorNode:
     def consume_energy(self, amount):
         """Reduce the node's stored energy by amount (floor at 0)."""
         try:
-            self.initial_energy = max(0.0, self.initial_energy - amount)
+            self._store.energy[self._idx] = max(0.0, self.initial_energy - amount)
         except Exception:
             pass
 
@@ -1,34 +1,121 @@
 # Initialization/routing_path.py
 import math
+import logging
 from collections import deque
+from Initialization.sim_log import get_logger
 
-def initialize_routing(sink_node, sensor_nodes, G):
-    """
-    Initialize multi-path routing for all sensor nodes based on the
-    Maximum P-hop routing broadcast algorithm described in your text.
+logger = get_logger('routing')
 
-    routing_table format:
-      routing_table[node_id] = {
-          "paths": [ [node,...,'sink'], ... ],   # each path starts at node and ends at 'sink'
-          "P": int or None
-      }
+# default cap on stored paths per node (k best by hop count, then bottleneck energy)
+MAX_PATHS_PER_NODE = 10
 
-    Note: sensor_nodes is a dict node_id -> SensorNode
-          G is a networkx Graph with positions and edges already added
-          sink_node.node_id should be the object's node id (e.g., 'sink')
+
+class _RouteBuilder:
     """
+    Holds the per-node path sets while the P-hop broadcast runs.
 
-    sink_id = sink_node.node_id
-    sink_pos = sink_node.location
+    Paths are tuples (node, ..., sink) kept in a set per node for O(1) dedup,
+    loop-free, and capped at max_paths per node (fewest hops first, ties broken
+    by the highest minimum residual energy along the path). Every receiver whose
+    table (paths or P) was updated is recorded in `changed`.
+    """
 
-    # 1) compute distances d_vs for all sensor nodes
-    node_distances = {}
-    for nid, node in sensor_nodes.items():
-        node_distances[nid] = math.dist(node.location, sink_pos)
+    def __init__(self, routing_table, sensor_nodes, G, f, node_distances, sink_pos, max_paths, blocked=()):
+        self.routing_table = routing_table
+        self.sensor_nodes = sensor_nodes
+        self.G = G
+        self.f = f
+        self.node_distances = node_distances
+        self.sink_pos = sink_pos
+        self.max_paths = max_paths
+        self.blocked = blocked
+        self.path_sets = {nid: set(entry["paths"]) for nid, entry in routing_table.items()}
+        self.queue = deque()
+        self.pending = set()
+        self.changed = set()
+
+    def _bottleneck(self, path):
+        energies = [getattr(self.sensor_nodes[n], 'initial_energy', 0.0) for n in path if n in self.sensor_nodes]
+        return min(energies) if energies else 0.0
+
+    def _rank(self, path):
+        return (len(path), -self._bottleneck(path))
+
+    def enqueue(self, sender, receiver):
+        # a queued (sender, receiver) update always reads the sender's latest table,
+        # so the same pair never needs to be queued twice
+        if (sender, receiver) in self.pending:
+            return
+        self.pending.add((sender, receiver))
+        self.queue.append((sender, receiver))
+
+    def merge(self, receiver, candidates):
+        """Merge candidate paths into receiver's table; return True if its kept set changed."""
+        entry = self.routing_table[receiver]
+        kept = self.path_sets.setdefault(receiver, set())
+        fresh = [p for p in candidates if p not in kept]
+        if not fresh:
+            return False
+        merged = list(entry["paths"]) + fresh
+        if self.max_paths is not None and len(merged) > self.max_paths:
+            merged.sort(key=self._rank)
+            merged = merged[:self.max_paths]
+            new_set = set(merged)
+            if new_set == kept:
+                return False
+        else:
+            merged.sort(key=self._rank)
+            new_set = set(merged)
+        entry["paths"] = merged
+        self.path_sets[receiver] = new_set
+        return True
+
+    def process(self, sender, receiver):
+        # sender's routing table Tu
+        Tu = self.routing_table.get(sender, {"paths": [], "P": None})["paths"]
+        # receiver node object
+        if receiver not in self.sensor_nodes or receiver in self.blocked:
+            # receiver might be sink or an unknown node; skip if not sensor
+            return False
+        v_node = self.sensor_nodes[receiver]
+        entry = self.routing_table.setdefault(receiver, {"paths": [], "P": None})
 
-    # 2) average distance averds (over sensor nodes reachable in initial D0)
-    #    In your description, averds is "average distance between sink and nodes within D0".
-    #    We don't have D0 here; use average over all sensor nodes as an approximation.
+        # If receiver has no P assigned yet -> initialize based on Tu
+        if entry["P"] is None:
+            d_vs = self.node_distances.get(receiver, math.dist(v_node.location, self.sink_pos))
+            # n = max number of hops among paths in Tu (if Tu empty, n=0)
+            n = max(((len(p) - 1) for p in Tu), default=0)
+            entry["P"] = self.f(n, d_vs)
+            v_node.P = entry["P"]
+            # append IDv to each path in Tu and save as Tv
+            self.merge(receiver, [(receiver,) + p for p in Tu if receiver not in p])
+            return True
+
+        # Receiver already has P: take the paths in Tu not in Tv whose hops stay
+        # within P once IDv is prepended (hops <= P_v - 1 in Tu)
+        P_v = entry["P"]
+        candidates = [(receiver,) + p for p in Tu if (len(p) - 1) <= (P_v - 1) and receiver not in p]
+        return self.merge(receiver, candidates)
+
+    def run(self):
+        while self.queue:
+            sender, receiver = self.queue.popleft()
+            self.pending.discard((sender, receiver))
+            if not self.process(sender, receiver):
+                continue
+            self.changed.add(receiver)
+            # forward update to neighbors except sender
+            for nbr in self.G.neighbors(receiver):
+                if nbr == sender or nbr not in self.sensor_nodes or nbr in self.blocked:
+                    continue
+                self.enqueue(receiver, nbr)
+
+
+def _routing_setup(sink_node, sensor_nodes):
+    sink_pos = sink_node.location
+    # 1) compute distances d_vs for all sensor nodes
+    node_distances = {nid: math.dist(node.location, sink_pos) for nid, node in sensor_nodes.items()}
+    # 2) average distance averds (approximated over all sensor nodes; D0 is not modelled)
     if len(node_distances) > 0:
         avg_ds = sum(node_distances.values()) / len(node_distances)
     else:
@@ -38,123 +125,131 @@ def initialize_routing(sink_node, sensor_nodes, G):
     def f(n, d):
         return int(n + math.ceil(d / (avg_ds if avg_ds > 0 else 1.0)))
 
-    # Initialize routing table dictionary
-    routing_table = {}
+    return node_distances, f
+
+
+def _sync_nodes(routing_table, sensor_nodes):
+    for nid, node in sensor_nodes.items():
+        entry = routing_table.get(nid)
+        if entry:
+            node.routing_paths = list(entry["paths"])
+            node.P = entry["P"]
+        else:
+            node.routing_paths = []
+            node.P = None
+
+
+def initialize_routing(sink_node, sensor_nodes, G, max_paths=MAX_PATHS_PER_NODE):
+    """
+    Initialize multi-path routing for all sensor nodes based on the
+    Maximum P-hop routing broadcast algorithm described in your text.
+
+    routing_table format:
+      routing_table[node_id] = {
+          "paths": [ (node,...,'sink'), ... ],   # tuples, best (fewest hops) first
+          "P": int or None
+      }
+
+    max_paths bounds the number of paths kept per node (None = unbounded).
+    Paths are loop-free and deduplicated through a per-node set.
 
-    # Sink's own entry: define its path list as [[sink]] and P = 0
-    routing_table[sink_id] = {"paths": [[sink_id]], "P": 0}
+    Note: sensor_nodes is a dict node_id -> SensorNode
+          G is a networkx Graph with positions and edges already added
+          sink_node.node_id should be the object's node id (e.g., 'sink')
+    """
+
+    sink_id = sink_node.node_id
+    node_distances, f = _routing_setup(sink_node, sensor_nodes)
+
+    # Sink's own entry: define its path list as [(sink,)] and P = 0
+    routing_table = {sink_id: {"paths": [(sink_id,)], "P": 0}}
     sink_node.P = 0
     sink_node.routing_paths = []
 
-    # Queue of (sender, receiver) broadcast updates to process.
+    builder = _RouteBuilder(routing_table, sensor_nodes, G, f, node_distances, sink_node.location, max_paths)
     # Start by enqueuing broadcasts from sink to its neighbors.
-    queue = deque()
     for nbr in G.neighbors(sink_id):
         if nbr in sensor_nodes:
-            # Tu for sink is [[sink]], so Tv for neighbor will be [ [nbr, sink] ]
-            # We'll prepare an entry for neighbor in the routing table (if missing)
-            if nbr not in routing_table:
-                routing_table[nbr] = {"paths": [], "P": None}
-            # create initial Tv from Tu by appending IDv to each path in Tu
-            new_paths = []
-            for path in routing_table[sink_id]["paths"]:
-                # path is ['sink'] -> neighbor path is [neighbor, 'sink']
-                new_paths.append([nbr] + list(path))
-            # store them (may be overwritten/merged later)
-            routing_table[nbr]["paths"].extend(new_paths)
-            queue.append((sink_id, nbr))
-
-    # Process queue: simulate nodes forwarding updates to their neighbors
-    while queue:
-        sender, receiver = queue.popleft()
-        # sender's routing table Tu
-        Tu = routing_table.get(sender, {"paths": [], "P": None})["paths"]
+            builder.enqueue(sink_id, nbr)
+    builder.run()
 
-        # receiver node object
-        if receiver not in sensor_nodes:
-            # receiver might be sink or an unknown node; skip if not sensor
-            continue
-        v_node = sensor_nodes[receiver]
+    # After propagation completes, assign routing paths and P to all sensor nodes
+    _sync_nodes(routing_table, sensor_nodes)
 
-        changed = False
+    # Debug summary; skipped entirely (no sorting or formatting) unless enabled
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("\n--- Routing Table Summary ---")
+        for nid in sorted(sensor_nodes.keys(), key=lambda x: (isinstance(x, str), x)):
+            node = sensor_nodes[nid]
+            logger.debug("Node %s: P=%s, paths=%s", nid, node.P, node.routing_paths)
 
-        # If receiver has no P assigned yet -> initialize based on Tu
-        if routing_table.get(receiver, {"P": None})["P"] is None:
-            # store PPK would happen here in real system (we already have it globally)
-            # compute d_vs
-            d_vs = node_distances.get(receiver, math.dist(v_node.location, sink_pos))
-            # n = max number of hops among paths in Tu (if Tu empty, n=0)
-            if len(Tu) == 0:
-                n = 0
-            else:
-                # each path stores nodes starting at sender and ending at sink
-                n = max((len(p) - 1) for p in Tu)  # hops = nodes_in_path - 1
-
-            # compute P using f(n, d_vs) (following your description)
-            P_v = f(n, d_vs)
-            routing_table[receiver] = {"paths": [], "P": P_v}
-            v_node.P = P_v
+    return routing_table
 
-            # append IDv to each path in Tu and save as Tv
-            Tv = []
-            for path in Tu:
-                # prepend receiver to the path
-                new_path = [receiver] + list(path)
-                # ensure no duplicates
-                if new_path not in Tv:
-                    Tv.append(new_path)
-            routing_table[receiver]["paths"].extend(Tv)
-            v_node.routing_paths = routing_table[receiver]["paths"].copy()
-            changed = True
 
-        else:
-            # Receiver already has P. According to algorithm:
-            # "There is a set of paths in Tu that do not belong to Tv and whose routing hops are less than P,
-            #  append IDv to each path in the set and update Tv"
-            P_v = routing_table[receiver]["P"]
-            # select candidate paths from Tu whose hops <= P_v - 1 (since after adding receiver they become <= P_v)
-            candidates = []
-            for path in Tu:
-                hops_in_path = len(path) - 1  # hops in Tu's paths (sender->...->sink)
-                if hops_in_path <= (P_v - 1):
-                    # candidate path for receiver is [receiver] + path
-                    new_path = [receiver] + list(path)
-                    # add only if not already present
-                    if new_path not in routing_table[receiver]["paths"]:
-                        candidates.append(new_path)
-            if candidates:
-                routing_table[receiver]["paths"].extend(candidates)
-                v_node.routing_paths = routing_table[receiver]["paths"].copy()
-                changed = True
-
-        # If changed or first-time receive (above), forward update to neighbors except sender
-        if changed:
-            for nbr in G.neighbors(receiver):
-                if nbr == sender:
-                    continue
-                # only forward to graph neighbors that are sensor nodes (skip sink here if needed)
-                if nbr in sensor_nodes:
-                    # Ensure the sender entry exists for the neighbor's processing
-                    if nbr not in routing_table:
-                        routing_table[nbr] = {"paths": [], "P": None}
-                    # When sending, neighbor will receive Tu = routing_table[receiver]["paths"]
-                    # so enqueue (receiver -> nbr)
-                    queue.append((receiver, nbr))
+def repair_routes(routing_table, removed, sink_node, sensor_nodes, G, max_paths=MAX_PATHS_PER_NODE, neighbor_index=None):
+    """
+    Incrementally repair the routing table after node(s) die or are blacklisted.
 
-    # After propagation completes, assign routing paths and P to all sensor nodes
-    for nid, node in sensor_nodes.items():
-        entry = routing_table.get(nid)
-        if entry:
-            node.routing_paths = entry["paths"].copy()
-            node.P = entry["P"]
-        else:
+    removed: a node id or an iterable of node ids. They are added to the sink's
+    revocation set SM["R"] (when present), every stored path through them is
+    invalidated, and only the nodes that lost paths are refilled by re-running
+    the P-hop broadcast from their neighbors. Unaffected entries are untouched.
+    Returns the set of node ids whose tables changed.
+    """
+    if isinstance(removed, (set, frozenset, list, tuple)):
+        removed = set(removed)
+    else:
+        removed = {removed}
+    revoked = getattr(sink_node, 'SM', {}).get("R") if isinstance(getattr(sink_node, 'SM', None), dict) else None
+    if revoked is not None:
+        revoked.update(removed)
+    blocked = set(revoked) if revoked is not None else set()
+    blocked |= removed
+
+    for nid in removed:
+        routing_table.pop(nid, None)
+        node = sensor_nodes.get(nid)
+        if node is not None:
             node.routing_paths = []
-            node.P = None
-
-    # Debug print (concise)
-    print("\n--- Routing Table Summary ---")
-    for nid in sorted(sensor_nodes.keys(), key=lambda x: (isinstance(x, str), x)):
-        node = sensor_nodes[nid]
-        print(f"Node {nid}: P={node.P}, paths={node.routing_paths}")
-
-    return routing_table
+        if neighbor_index is not None:
+            neighbor_index.remove(nid)
+
+    # 1) invalidate only the paths that pass through a removed node
+    affected = set()
+    for nid, entry in routing_table.items():
+        paths = entry["paths"]
+        kept = [p for p in paths if removed.isdisjoint(p)]
+        if len(kept) != len(paths):
+            entry["paths"] = kept
+            affected.add(nid)
+    if not affected:
+        return affected
+
+    # 2) re-propagate into the affected nodes from their live neighbors
+    node_distances, f = _routing_setup(sink_node, sensor_nodes)
+    builder = _RouteBuilder(routing_table, sensor_nodes, G, f, node_distances, sink_node.location, max_paths, blocked=blocked)
+    for nid in affected:
+        for nbr in G.neighbors(nid):
+            if nbr in blocked or nbr not in routing_table or not routing_table[nbr]["paths"]:
+                continue
+            builder.enqueue(nbr, nid)
+    builder.run()
+
+    # the broadcast can also improve tables beyond the affected nodes
+    changed = affected | builder.changed
+    _sync_nodes(routing_table, {nid: sensor_nodes[nid] for nid in changed if nid in sensor_nodes})
+    return changed
+
+
+def repair_failed_nodes(routing_table, sink_node, sensor_nodes, G, suspicious=(), max_paths=MAX_PATHS_PER_NODE, neighbor_index=None):
+    """
+    Remove from the routing table every node whose energy is exhausted or that
+    is listed in `suspicious` (e.g. malicious_node_management.suspicious_nodes),
+    skipping nodes already revoked. Returns the set of repaired node ids.
+    """
+    revoked = sink_node.SM.get("R", set()) if isinstance(getattr(sink_node, 'SM', None), dict) else set()
+    failed = {nid for nid, node in sensor_nodes.items()
+              if nid not in revoked and (getattr(node, 'initial_energy', 1.0) <= 0 or nid in suspicious)}
+    if not failed:
+        return set()
+    return repair_routes(routing_table, failed, sink_node, sensor_nodes, G, max_paths=max_paths, neighbor_index=neighbor_index)
@@ -0,0 +1,146 @@
+import os
+import json
+import pickle
+import random
+import hashlib
+import numpy as np
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.backends import default_backend
+
+from Initialization.network import initialize_network
+from Initialization.sim_log import get_logger
+
+logger = get_logger('setup_cache')
+
+# bump when the snapshot layout or initialize_network output changes
+CACHE_VERSION = 2
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), '.setup_cache')
+
+
+def key_to_pem(private_key):
+    return private_key.private_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PrivateFormat.PKCS8,
+        encryption_algorithm=serialization.NoEncryption(),
+    )
+
+
+def key_from_pem(data):
+    return serialization.load_pem_private_key(data, password=None, backend=default_backend())
+
+
+def load_or_create_sink_key(path, key_size=2048):
+    """Load the sink's RSA private key from a PEM file, generating and saving it on first use."""
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return key_from_pem(f.read())
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=key_size, backend=default_backend())
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # unencrypted private key: owner-only file, written then renamed into place
+    tmp = f"{path}.{os.getpid()}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(key_to_pem(private_key))
+    os.replace(tmp, path)
+    return private_key
+
+
+def cache_key(params):
+    """Stable hash of the initialize_network parameters (and seed) for the snapshot file name."""
+    keyed = dict(params)
+    key = keyed.pop('sink_private_key', None)
+    if key is not None:
+        # identify a caller-supplied key by its public key, not the object
+        der = key.public_key().public_bytes(serialization.Encoding.DER,
+                                            serialization.PublicFormat.SubjectPublicKeyInfo)
+        keyed['sink_key'] = hashlib.sha256(der).hexdigest()
+    keyed['version'] = CACHE_VERSION
+    blob = json.dumps(keyed, sort_keys=True, default=str)
+    return hashlib.sha256(blob.encode()).hexdigest()[:20]
+
+
+def save_snapshot(path, network, rng_state=None):
+    """
+    Pickle a built network (the initialize_network tuple). RSA key objects are
+    not picklable, so the sink key travels as PEM and is re-attached on load.
+    """
+    G, sensor_nodes, sink, positions, routing_table = network
+    private_key, public_key = sink.private_key, sink.public_key
+    ppk = sink.SM['PPK']
+    sink.private_key = sink.public_key = None
+    ppk['pk'] = None
+    try:
+        payload = {
+            'version': CACHE_VERSION,
+            'network': network,
+            'sink_key_pem': key_to_pem(private_key) if private_key is not None else None,
+            'rng_state': rng_state,
+        }
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # the payload carries the unencrypted sink key: owner-only, like the PEM file
+        tmp = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+    finally:
+        sink.private_key, sink.public_key = private_key, public_key
+        ppk['pk'] = public_key
+
+
+def load_snapshot(path):
+    """Unpickle a snapshot; returns (network tuple, rng_state)."""
+    with open(path, 'rb') as f:
+        payload = pickle.load(f)
+    if payload.get('version') != CACHE_VERSION:
+        raise ValueError(f"snapshot {path} has version {payload.get('version')}, expected {CACHE_VERSION}")
+    network = payload['network']
+    sink = network[2]
+    if payload['sink_key_pem'] is not None:
+        sink.private_key = key_from_pem(payload['sink_key_pem'])
+        sink.public_key = sink.private_key.public_key()
+        sink.SM['PPK']['pk'] = sink.public_key
+    return network, payload['rng_state']
+
+
+def load_or_build_network(cache_dir=None, force_rebuild=False, **params):
+    """
+    initialize_network(**params) behind an on-disk snapshot cache.
+
+    The snapshot (positions, graph, node state, PPK, sink key, routing table and
+    the RNG state right after construction) is keyed by a hash of params and
+    seed. A later call with the same params unpickles it instead of rebuilding;
+    the RNG state is restored too, so the run continues exactly as a fresh build
+    would. force_rebuild=True ignores and overwrites an existing snapshot.
+    Without a seed the network is random by design and is never cached.
+    """
+    if params.get('seed') is None:
+        return initialize_network(**params)
+    cache_dir = cache_dir or DEFAULT_CACHE_DIR
+    path = os.path.join(cache_dir, f"network-{cache_key(params)}.pkl")
+
+    if not force_rebuild and os.path.exists(path):
+        try:
+            network, rng_state = load_snapshot(path)
+        except Exception as e:
+            logger.warning("Warning: ignoring unreadable setup snapshot %s: %s", path, e)
+        else:
+            if rng_state is not None:
+                random.setstate(rng_state[0])
+                np.random.set_state(rng_state[1])
+            logger.info("Loaded network setup from %s", path)
+            return network
+
+    network = initialize_network(**params)
+    rng_state = (random.getstate(), np.random.get_state())
+    try:
+        save_snapshot(path, network, rng_state)
+        logger.info("Saved network setup to %s", path)
+    except Exception as e:
+        logger.warning("Warning: couldn't save setup snapshot %s: %s", path, e)
+    return network
@@ -0,0 +1,39 @@
+import sys
+import logging
+
+# Root of the simulation's logger tree; modules log to children such as
+# "lsdt.msgtrans" so one call here controls all of them.
+LOGGER_NAME = 'lsdt'
+QUIET = logging.CRITICAL + 1
+
+_root = logging.getLogger(LOGGER_NAME)
+_root.addHandler(logging.NullHandler())
+
+
+def get_logger(name):
+    return logging.getLogger(f"{LOGGER_NAME}.{name}")
+
+
+def configure_logging(level=logging.INFO, stream=None):
+    """
+    Set the level of every simulation logger and attach a plain "%(message)s"
+    handler (stdout unless `stream` is given; replaces the one from an earlier
+    call), so enabled output looks like the old prints.
+
+    level:    a logging level, its name ('DEBUG', 'INFO', ...) or 'quiet'/None.
+              Quiet disables all simulation output; logger calls then return
+              before any message argument is formatted.
+    """
+    if level is None or (isinstance(level, str) and level.lower() == 'quiet'):
+        level = QUIET
+    elif isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+    _root.setLevel(level)
+    _root.propagate = False
+    for h in [h for h in _root.handlers if getattr(h, '_lsdt', False)]:
+        _root.removeHandler(h)
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    handler._lsdt = True
+    _root.addHandler(handler)
+    return _root
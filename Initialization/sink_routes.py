@@ -0,0 +1,131 @@
+# Initialization/sink_routes.py
+import math
+from collections import deque
+
+from Initialization.neighbor_index import get_neighbor_index
+
+
+class SinkRouteTable:
+    """
+    Cached sink-ward next hops derived from the shared NeighborIndex.
+
+    greedy:   per node, its neighbors (within the node's radius) sorted by
+              distance to the sink, i.e. the order a greedy report walks.
+    shortest: BFS hop counts to the sink over the same neighbor relation; per
+              node, neighbors sorted by (hops to sink, distance to sink).
+
+    Entries are filled lazily per node and dropped as soon as the index
+    version changes (a node moved, died or was added). Suspicion is not baked
+    in: avoid sets are applied at query time by skipping entries, so newly
+    suspicious nodes never force a rebuild and a route costs O(hops).
+    """
+
+    def __init__(self, index, sink_id, nodes):
+        self.index = index
+        self.sink_id = sink_id
+        self.nodes = nodes
+        self.version = None
+        self._greedy = {}
+        self._shortest = {}
+        self._hops = None
+
+    def _check(self):
+        if self.version != self.index.version:
+            self.version = self.index.version
+            self._greedy.clear()
+            self._shortest.clear()
+            self._hops = None
+
+    def _radius(self, node_id):
+        node = self.nodes.get(node_id)
+        return getattr(node, 'communication_radius', 0) or 0
+
+    def _sink_distance(self, node_id):
+        x, y = self.index.positions[node_id]
+        sx, sy = self.index.positions[self.sink_id]
+        return math.hypot(x - sx, y - sy)
+
+    def greedy(self, node_id):
+        """Neighbor ids of node_id, closest to the sink first (cached)."""
+        self._check()
+        cands = self._greedy.get(node_id)
+        if cands is None:
+            found = self.index.query(self.index.positions[node_id], self._radius(node_id), exclude=node_id)
+            cands = [nid for nid, _ in found]
+            cands.sort(key=self._sink_distance)
+            self._greedy[node_id] = cands
+        return cands
+
+    def hops(self):
+        """BFS hop count to the sink for every node that can reach it (cached)."""
+        self._check()
+        if self._hops is None:
+            max_radius = max((self._radius(n) for n in self.index.positions), default=0)
+            hops = {self.sink_id: 0}
+            queue = deque([self.sink_id])
+            while queue:
+                cur = queue.popleft()
+                for nid, dist in self.index.query(self.index.positions[cur], max_radius, exclude=cur):
+                    # nid can send to cur if cur lies within nid's own range
+                    if nid not in hops and dist <= self._radius(nid):
+                        hops[nid] = hops[cur] + 1
+                        queue.append(nid)
+            self._hops = hops
+        return self._hops
+
+    def shortest(self, node_id):
+        """Neighbor ids of node_id ordered by (hops to sink, distance to sink) (cached)."""
+        self._check()
+        cands = self._shortest.get(node_id)
+        if cands is None:
+            hops = self.hops()
+            cands = [nid for nid in self.greedy(node_id) if nid in hops]
+            cands.sort(key=lambda nid: hops[nid])  # stable: keeps sink distance order within a level
+            self._shortest[node_id] = cands
+        return cands
+
+    def next_hop(self, node_id, avoid=(), visited=(), mode='greedy'):
+        """First cached candidate of node_id not in avoid/visited (and known to `nodes`), else None."""
+        cands = self.shortest(node_id) if mode == 'shortest' else self.greedy(node_id)
+        for nid in cands:
+            if nid in avoid or nid in visited or nid not in self.nodes:
+                continue
+            return nid
+        return None
+
+    def route(self, start_id, avoid=(), mode='greedy', exclude=()):
+        """
+        Loop-free walk from start_id to the sink; returns the id path or None.
+        `avoid` is only probed (never copied), so a large suspicious set is free;
+        `exclude` holds a few extra ids to skip for this walk only.
+        """
+        path = [start_id]
+        visited = {start_id, *exclude}
+        current = start_id
+        for _ in range(len(self.index.positions)):
+            if current == self.sink_id:
+                return path
+            nxt = self.next_hop(current, avoid=avoid, visited=visited, mode=mode)
+            if nxt is None:
+                return None
+            path.append(nxt)
+            visited.add(nxt)
+            current = nxt
+        return path if current == self.sink_id else None
+
+
+def get_sink_routes(sink, all_nodes):
+    """
+    Return the SinkRouteTable attached to the sink (built on first use and
+    rebuilt if the neighbor index was replaced).
+    """
+    index = get_neighbor_index(sink, all_nodes)
+    table = getattr(sink, 'sink_routes', None)
+    if table is None or table.index is not index:
+        table = SinkRouteTable(index, sink.node_id, all_nodes)
+        try:
+            sink.sink_routes = table
+        except Exception:
+            pass
+    table.nodes = all_nodes
+    return table
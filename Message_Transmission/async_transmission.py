@@ -0,0 +1,273 @@
+import asyncio
+import time
+from collections import defaultdict, deque
+from contextlib import asynccontextmanager
+
+from Initialization.neighbor_index import get_neighbor_index
+from Initialization.sim_log import get_logger
+from Message_Transmission.malicious_node_management import (
+    send_message, message_signature_hash, count_forward_to_malicious,
+    check_response, rank_alternatives, flush_hop_updates,
+)
+from Message_Transmission.simulation_context import get_context
+from Message_Transmission.event_scheduler import EventScheduler
+from Message_Transmission.msgtrans import (
+    euclidean_distance, find_neighbors, step1_send_query, step2_neighbors_respond,
+    step3_decrypt_and_collect, step4_select_relay, step5_forward_message,
+)
+
+logger = get_logger('async')
+
+
+class VirtualClock:
+    """
+    Virtual-clock driver for the asyncio engine, on top of an EventScheduler.
+
+    send_message schedules deliveries through now / schedule / cancel like on
+    any scheduler; share coroutines wait with `await clock.sleep(delay)`. Once
+    every share is parked (in sleep() or queued for a node lock) the clock
+    jumps to the next event, so a TD wait costs no wall-clock time and a
+    delivery due at the send time always fires before the TD expiry that
+    checks for it.
+
+    time_scale=None runs as fast as possible; a positive value paces the
+    virtual clock at time_scale real seconds per simulated second (e.g. for
+    visualisation).
+    """
+
+    def __init__(self, scheduler=None, time_scale=None):
+        if time_scale is not None and time_scale <= 0:
+            raise ValueError(f"time_scale must be positive or None, got {time_scale!r}")
+        self.scheduler = scheduler if scheduler is not None else EventScheduler()
+        self.time_scale = time_scale
+        # coroutines waiting on the clock or on a lock holder
+        self.parked = 0
+
+    @property
+    def now(self):
+        return self.scheduler.now
+
+    def schedule(self, delay, callback, *args):
+        return self.scheduler.schedule(delay, callback, *args)
+
+    def cancel(self, handle):
+        return self.scheduler.cancel(handle)
+
+    def _wake(self, fut):
+        if not fut.done():
+            self.parked -= 1
+            fut.set_result(None)
+
+    async def sleep(self, delay):
+        fut = asyncio.get_running_loop().create_future()
+        self.scheduler.schedule(delay, self._wake, fut)
+        self.parked += 1
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.cancelled():
+                self.parked -= 1
+            raise
+
+    async def run(self, coros):
+        """Run coroutines to completion on the virtual clock; results keep input order."""
+        tasks = [asyncio.ensure_future(c) for c in coros]
+        while True:
+            live = sum(not t.done() for t in tasks)
+            if not live:
+                break
+            if self.parked >= live:
+                when = self.scheduler.next_time()
+                if when is None:
+                    raise RuntimeError("all transmissions are blocked and no event is pending")
+                if self.time_scale is not None and when > self.now:
+                    await asyncio.sleep((when - self.now) * self.time_scale)
+                self.scheduler.run_until(when)
+            await asyncio.sleep(0)
+        return [t.result() for t in tasks]
+
+
+class NodeLocks:
+    """
+    One lock per node id. A send holds the locks of both endpoints for the
+    whole send -> TD wait -> response check, so concurrent shares never
+    interleave on a node's energy, last_received_message or frwd_data_cnt.
+    Locks are always taken in a fixed order to avoid deadlocks. A released lock
+    is handed straight to the next waiter, and waiters count as parked on the
+    clock, so the clock only advances when nobody can make progress.
+    """
+
+    def __init__(self, clock):
+        self.clock = clock
+        self._held = set()
+        self._waiters = defaultdict(deque)
+
+    async def _acquire(self, nid):
+        if nid not in self._held:
+            self._held.add(nid)
+            return
+        fut = asyncio.get_running_loop().create_future()
+        self._waiters[nid].append(fut)
+        self.clock.parked += 1
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.cancelled():
+                self.clock.parked -= 1
+            else:
+                # ownership was handed over just before the cancel
+                self._release(nid)
+            raise
+
+    def _release(self, nid):
+        waiters = self._waiters.get(nid)
+        while waiters:
+            fut = waiters.popleft()
+            if not fut.done():
+                self.clock.parked -= 1
+                fut.set_result(None)
+                return
+        self._held.discard(nid)
+
+    @asynccontextmanager
+    async def hold(self, *node_ids):
+        ordered = sorted(set(node_ids), key=lambda x: (isinstance(x, str), str(x)))
+        acquired = []
+        try:
+            for nid in ordered:
+                await self._acquire(nid)
+                acquired.append(nid)
+            yield
+        finally:
+            for nid in reversed(acquired):
+                self._release(nid)
+
+
+async def async_forward_and_monitor(u, v, message, TD, all_nodes, sink, locks, scheduler, context=None):
+    """asyncio counterpart of forward_and_monitor; the TD wait yields to other shares."""
+    context = get_context(context)
+    message_hash = message_signature_hash(message)
+    message['hash'] = message_hash
+
+    index = get_neighbor_index(sink, all_nodes)
+    tried = set()
+    ranked = None
+    target = v
+    max_retries = 3
+    attempt = 0
+
+    while attempt < max_retries:
+        async with locks.hold(u.node_id, target.node_id):
+            count_forward_to_malicious(u, target, context=context)
+            send_message(u, target, message, scheduler=scheduler, context=context)
+            await scheduler.sleep(TD)
+            if check_response(u, target, message, message_hash, sink, all_nodes, context=context):
+                # success; send this hop's reports and reputation changes in one batch
+                flush_hop_updates(context, all_nodes, sink, now=scheduler.now)
+                return target.node_id
+
+        tried.add(target.node_id)
+        attempt += 1
+        if attempt >= max_retries:
+            break
+
+        if ranked is None:
+            ranked = iter(rank_alternatives(u, message, tried, all_nodes, sink, index, k=max_retries))
+        best_id = next((c for c in ranked if c not in tried), None)
+        if best_id is None:
+            break
+        target = all_nodes[best_id]
+
+    context.count('forward_failed')
+    logger.info("All attempts to forward from Node %s failed. Giving up.", u.node_id)
+    flush_hop_updates(context, all_nodes, sink, now=scheduler.now)
+    return None
+
+
+async def async_simulate_message_transmission(sensor_nodes, sink, message, locks, scheduler, TD=1.0, L=100, context=None):
+    """
+    Route one message (share) from message['path*'][0] to the sink on the running
+    event loop. Same hop logic as simulate_message_transmission (without CSV
+    snapshots). Returns the same result dict shape minus the frwd summaries.
+    """
+    context = get_context(context)
+    all_nodes = sensor_nodes.copy()
+    if getattr(sink, 'node_id', None) not in all_nodes:
+        all_nodes[sink.node_id] = sink
+    index = get_neighbor_index(sink, all_nodes)
+
+    message = message.copy()
+    message.setdefault('TS', int(time.time()))
+    message.setdefault('path', [])
+    if not message.get('path*'):
+        message['path*'] = [next(iter(sensor_nodes))]
+    else:
+        message['path*'] = list(message['path*'])
+    current_node = all_nodes[message['path*'][-1]]
+
+    try:
+        lower_bound = sink.SM['PPK']['f'](len(sensor_nodes))
+    except Exception:
+        lower_bound = 0
+    max_hops = max(lower_bound, len(sensor_nodes))
+    sink_radius = getattr(sink, 'communication_radius', None)
+
+    hop = 0
+    while hop < max_hops:
+        context.count('hop')
+        dist_to_sink = euclidean_distance(current_node.location, sink.location)
+        radius = current_node.communication_radius
+        if dist_to_sink <= min(radius, sink_radius if sink_radius is not None else radius):
+            actual = await async_forward_and_monitor(current_node, sink, message, TD, all_nodes, sink, locks, scheduler, context=context)
+            if actual is None:
+                logger.info("Forward to sink failed. Stopping transmission.")
+                break
+            message['path*'].append(actual)
+            context.count('delivered')
+            hop += 1
+            break
+
+        neighbors = find_neighbors(current_node, message, all_nodes, index)
+        if not neighbors:
+            logger.info("No neighbors within range of Node %s. Stopping transmission.", current_node.node_id)
+            break
+
+        queries = step1_send_query(current_node, message, neighbors, radius, context=context)
+        responses = step2_neighbors_respond(queries, sink.location, all_nodes, context=context)
+        metrics = step3_decrypt_and_collect(responses, queries)
+        selected_id = step4_select_relay(metrics, current_node, message, all_nodes, L=L, context=context)
+
+        actual = await async_forward_and_monitor(current_node, all_nodes[selected_id], message, TD, all_nodes, sink, locks, scheduler, context=context)
+        if actual is None:
+            logger.info("Forwarding failed for current hop. Stopping transmission.")
+            break
+        message = step5_forward_message(message, actual)
+        current_node = all_nodes[actual]
+        hop += 1
+
+    message['final_hop'] = current_node.node_id
+    message['total_hops'] = hop + 1
+    # anomaly reports / reputation deltas still held back by a time window go out now
+    flush_hop_updates(context, all_nodes, sink)
+    return {'message': message, 'all_nodes': all_nodes, 'sink': sink}
+
+
+async def async_transmit_all(sensor_nodes, sink, messages, TD=1.0, time_scale=None, context=None):
+    """
+    Run every message concurrently on the current loop, on a VirtualClock over
+    the context's scheduler; results keep input order.
+    """
+    scheduler = VirtualClock(get_context(context).scheduler, time_scale=time_scale)
+    locks = NodeLocks(scheduler)
+    return await scheduler.run([async_simulate_message_transmission(sensor_nodes, sink, m, locks, scheduler, TD=TD, context=context)
+                                for m in messages])
+
+
+def transmit_concurrently(sensor_nodes, sink, messages, TD=1.0, time_scale=None, context=None):
+    """
+    Send many messages (e.g. all shares of one message, or messages from several
+    sources: set message['path*'] = [source_id]) concurrently on one event loop.
+    TD waits run on the virtual clock, so total simulated latency is roughly the
+    slowest path rather than the sum of all paths, at no wall-clock cost.
+    """
+    return asyncio.run(async_transmit_all(sensor_nodes, sink, messages, TD=TD, time_scale=time_scale, context=context))
@@ -0,0 +1,128 @@
+import os
+import glob
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional dependency: fall back to .npy row groups
+    pa = None
+    pq = None
+
+# write_snapshots schema plus run_id, hop and is_malicious, with fixed types
+SNAPSHOT_DTYPE = np.dtype([
+    ('run_id', np.int64),
+    ('hop', np.int64),
+    ('node_id', np.int64),
+    ('energy', np.float64),
+    ('dist_to_sink_node', np.float64),
+    ('reputation', np.float64),
+    ('anomaly_count', np.int64),
+    ('suspicious_count', np.int64),
+    ('neighbour_count', np.int64),
+    ('is_malicious', np.bool_),
+])
+
+
+class ColumnarMetricsWriter:
+    """
+    Typed, append-only columnar writer for node snapshots.
+
+    Rows (dicts, as passed to csv.DictWriter.writerow) are buffered and written
+    as one row group every row_group_size rows. `path` is a directory that
+    accumulates across writers and processes, like the CSV:
+      - format='parquet' (needs pyarrow): each writer opens its own part file
+        <path>/part-00000.parquet, part-00001.parquet, ... and appends its row
+        groups to it; the directory reads back as one parquet dataset
+      - format='npy': each row group is a structured-array file
+        <path>/part-00000.npy, part-00001.npy, ... readable with mmap
+    format=None picks parquet for *.parquet paths when pyarrow is installed,
+    npy otherwise.
+    """
+
+    def __init__(self, path, format=None, row_group_size=100_000, dtype=SNAPSHOT_DTYPE):
+        if format is None:
+            format = 'parquet' if (path.endswith('.parquet') and pq is not None) else 'npy'
+        if format == 'parquet' and pq is None:
+            raise ImportError("pyarrow is required for format='parquet'")
+        self.path = path
+        self.format = format
+        self.row_group_size = row_group_size
+        self.dtype = dtype
+        self.fieldnames = list(dtype.names)
+        self._buffer = {name: [] for name in self.fieldnames}
+        self._count = 0
+        self._parquet = None
+        self._closed = False
+        os.makedirs(path, exist_ok=True)
+        self._part = len(glob.glob(os.path.join(path, f'part-*.{format}')))
+
+    def writerow(self, row):
+        for name in self.fieldnames:
+            self._buffer[name].append(row.get(name, 0))
+        self._count += 1
+        if self._count >= self.row_group_size:
+            self.flush()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        if not self._count:
+            return
+        group = np.empty(self._count, dtype=self.dtype)
+        for name in self.fieldnames:
+            group[name] = self._buffer[name]
+            self._buffer[name] = []
+        self._count = 0
+        if self.format == 'parquet':
+            table = pa.table({name: group[name] for name in self.fieldnames})
+            if self._parquet is None:
+                part = os.path.join(self.path, f'part-{self._part:05d}.parquet')
+                self._parquet = pq.ParquetWriter(part, table.schema)
+            self._parquet.write_table(table)
+        else:
+            np.save(os.path.join(self.path, f'part-{self._part:05d}.npy'), group)
+            self._part += 1
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        if self._parquet is not None:
+            self._parquet.close()
+            self._parquet = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_row_groups(path):
+    """Memory-mapped structured arrays, one per .npy row group (no copy)."""
+    files = sorted(glob.glob(os.path.join(path, 'part-*.npy')))
+    return [np.load(f, mmap_mode='r') for f in files]
+
+
+def load_columns(path):
+    """
+    Load snapshot columns as a dict name -> array. Parquet part files (or a
+    single parquet file) are read as one dataset with memory mapping; a single
+    .npy row group is returned zero-copy, several are concatenated per column.
+    """
+    if os.path.isfile(path) or glob.glob(os.path.join(path, 'part-*.parquet')):
+        if pq is None:
+            raise ImportError("pyarrow is required to read parquet files")
+        table = pq.read_table(path, memory_map=True)
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+    groups = load_row_groups(path)
+    if not groups:
+        return {name: np.empty(0, dtype=SNAPSHOT_DTYPE[name]) for name in SNAPSHOT_DTYPE.names}
+    names = groups[0].dtype.names
+    if len(groups) == 1:
+        return {name: groups[0][name] for name in names}
+    return {name: np.concatenate([g[name] for g in groups]) for name in names}
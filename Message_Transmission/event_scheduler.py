@@ -0,0 +1,83 @@
+import heapq
+import itertools
+
+
+class EventScheduler:
+    """
+    Discrete-event scheduler with a virtual clock.
+
+    Events are (time, seq, callback, args) entries in one priority queue; `seq`
+    is a global insertion counter so events due at the same virtual time run in
+    the order they were scheduled. Advancing the clock never sleeps, so a TD
+    timeout costs no wall-clock time.
+
+    Insertion is O(log n). Cancellation is O(1): the entry is marked dead and
+    skipped when it reaches the head; the heap is compacted once more than half
+    of it is dead.
+    """
+
+    def __init__(self, start_time=0.0):
+        self.now = float(start_time)
+        self._queue = []
+        self._seq = itertools.count()
+        self._cancelled = 0
+
+    def __len__(self):
+        # live (not cancelled) events
+        return len(self._queue) - self._cancelled
+
+    def schedule(self, delay, callback, *args):
+        """Run callback(*args) `delay` virtual seconds from now. Returns the event entry."""
+        event = [self.now + max(0.0, float(delay)), next(self._seq), callback, args]
+        heapq.heappush(self._queue, event)
+        return event
+
+    def schedule_at(self, when, callback, *args):
+        return self.schedule(when - self.now, callback, *args)
+
+    def cancel(self, event):
+        """Cancel a pending event. Returns False if it already ran or was cancelled."""
+        if not isinstance(event, list) or event[2] is None:
+            return False
+        event[2] = None
+        event[3] = ()
+        self._cancelled += 1
+        if self._cancelled > 64 and 2 * self._cancelled > len(self._queue):
+            self._queue = [e for e in self._queue if e[2] is not None]
+            heapq.heapify(self._queue)
+            self._cancelled = 0
+        return True
+
+    def next_time(self):
+        """Virtual time of the earliest live event, or None if nothing is pending."""
+        while self._queue and self._queue[0][2] is None:
+            heapq.heappop(self._queue)
+            self._cancelled -= 1
+        return self._queue[0][0] if self._queue else None
+
+    def run_until(self, when):
+        """Process every event due at or before `when`, then set the clock to `when`."""
+        while self._queue and self._queue[0][0] <= when:
+            event = heapq.heappop(self._queue)
+            event_time, _, callback, args = event
+            if callback is None:
+                self._cancelled -= 1
+                continue
+            # mark as done so a late cancel() is a no-op
+            event[2] = None
+            self.now = max(self.now, event_time)
+            callback(*args)
+        self.now = max(self.now, when)
+
+    def advance(self, delta):
+        """Move the virtual clock forward by `delta` seconds, firing due events."""
+        self.run_until(self.now + max(0.0, float(delta)))
+
+    def run(self):
+        """Drain the queue completely."""
+        while self._queue:
+            self.run_until(self._queue[0][0])
+
+
+# shared scheduler used when callers do not supply their own
+default_scheduler = EventScheduler()
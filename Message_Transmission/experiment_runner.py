@@ -0,0 +1,217 @@
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import time
+import random
+import itertools
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from Initialization.network import initialize_network
+from Initialization.setup_cache import load_or_build_network
+from Initialization.sim_log import configure_logging
+from Message_encryption.share_generation import generate_and_share, reconstruct_and_decrypt
+from Message_Transmission.malicious_node_management import mark_node_as_malicious
+from Message_Transmission.simulation_context import SimulationContext
+from Message_Transmission.msgtrans import simulate_message_transmission
+
+# configuration keys that identify a group when aggregating runs
+GROUP_KEYS = ('num_nodes', 't', 'malicious_fraction', 'behavior')
+
+
+def build_grid(seeds, num_nodes=(30,), t=(3,), malicious_fraction=(0.0,), behavior=('no_response',), delay=10.0):
+    """Cartesian product of the sweep axes as a list of run configs (dicts)."""
+    configs = []
+    for run_id, (n, tt, frac, beh, seed) in enumerate(itertools.product(num_nodes, t, malicious_fraction, behavior, seeds)):
+        configs.append({
+            'run_id': run_id,
+            'seed': seed,
+            'num_nodes': n,
+            't': tt,
+            'malicious_fraction': frac,
+            'behavior': beh,
+            'delay': delay,
+        })
+    return configs
+
+
+def run_single(config):
+    """
+    One independent run: build the network for config['seed'], mark a random
+    malicious_fraction of sensor nodes (never the source), send t+1 shares of a
+    message to the sink and try to recover it from the first t delivered shares.
+    Returns a flat dict of the config plus delivery, hop, energy and detection metrics.
+    """
+    started = time.perf_counter()
+    seed = config.get('seed')
+    t = config.get('t', 3)
+    # each run owns its suspicions, reputations, query RNG and scheduler
+    context = SimulationContext(seed=seed)
+
+    if config.get('cache_dir'):
+        # reuse setup snapshots across sweeps (same seed + size -> same network)
+        network = load_or_build_network(cache_dir=config['cache_dir'], num_nodes=config.get('num_nodes', 30), seed=seed)
+    else:
+        network = initialize_network(num_nodes=config.get('num_nodes', 30), seed=seed)
+    G, sensor_nodes, sink, positions, routing_table = network
+    source_id = next(iter(sensor_nodes))
+
+    rng = random.Random(seed)
+    candidates = [nid for nid in sensor_nodes if nid != source_id]
+    n_bad = int(round(config.get('malicious_fraction', 0.0) * len(candidates)))
+    for nid in rng.sample(candidates, n_bad):
+        mark_node_as_malicious(sensor_nodes[nid], behavior=config.get('behavior', 'no_response'), delay=config.get('delay'))
+    malicious = {nid for nid, node in sensor_nodes.items() if getattr(node, 'malicious', False)}
+
+    store = sink.node_store
+    energy_before = float(store.energy[:store.size].sum())
+
+    secret = rng.randint(1, 10 ** 9)
+    data = generate_and_share(message=secret, t=t)
+    delivered, hops = [], []
+    for i in range(t + 1):
+        message = {'id': f"m{config.get('run_id', 0)}-share{i + 1}", 'path*': [source_id]}
+        result = simulate_message_transmission(sensor_nodes=sensor_nodes, sink=sink, positions=positions,
+                                               message_override=message, csv_path=config.get('csv_path', False),
+                                               run_id=config.get('run_id', 0), context=context)
+        path = result['message']['path*']
+        if path and path[-1] == sink.node_id:
+            delivered.append(i)
+            hops.append(len(path) - 1)
+
+    recovered = False
+    if len(delivered) >= t:
+        indices = delivered[:t]
+        try:
+            recovered = reconstruct_and_decrypt(
+                indices,
+                [data["shares_key"][i] for i in indices],
+                [data["shares_msg"][i] for i in indices],
+                data["B_key"], data["B_msg"], data["enc_key_len"], data["ct_len"],
+                data["ecc_priv"], data["ecc_pub"], data["iv"]) == secret
+        except Exception:
+            recovered = False
+
+    flagged = context.suspicious_nodes & set(sensor_nodes)
+    true_pos = len(flagged & malicious)
+    row = dict(config)
+    row.update({
+        'shares_sent': t + 1,
+        'shares_delivered': len(delivered),
+        'delivery_rate': len(delivered) / (t + 1),
+        'recovered': recovered,
+        'mean_hops': float(np.mean(hops)) if hops else None,
+        'energy_used': energy_before - float(store.energy[:store.size].sum()),
+        'malicious_count': len(malicious),
+        'flagged_count': len(flagged),
+        'true_positives': true_pos,
+        'false_positives': len(flagged) - true_pos,
+        'detection_rate': true_pos / len(malicious) if malicious else None,
+        'timeouts': context.counters['timeout'],
+        'forward_failures': context.counters['forward_failed'],
+        'anomaly_reports': context.counters['anomaly_reports'],
+        'report_batches': context.counters['report_batches'],
+        'elapsed': time.perf_counter() - started,
+    })
+    return row
+
+
+def _init_worker(log_level):
+    configure_logging(log_level)
+
+
+def _error_row(config, error):
+    row = dict(config)
+    row['error'] = repr(error)
+    return row
+
+
+def iter_results(configs, max_workers=None, log_level='quiet'):
+    """
+    Run configs across a ProcessPoolExecutor (one process per core by default)
+    and yield each result as soon as its worker finishes (completion order).
+    A failed run yields the config with an 'error' entry instead of metrics.
+    max_workers=1 runs in-process, which is handy for debugging.
+    """
+    if max_workers == 1:
+        configure_logging(log_level)
+        for config in configs:
+            try:
+                row = run_single(config)
+            except Exception as e:
+                row = _error_row(config, e)
+            yield row
+        return
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker, initargs=(log_level,)) as pool:
+        futures = {pool.submit(run_single, config): config for config in configs}
+        for future in as_completed(futures):
+            try:
+                row = future.result()
+            except Exception as e:
+                row = _error_row(futures[future], e)
+            yield row
+
+
+def _mean(values):
+    values = [v for v in values if v is not None]
+    return float(np.mean(values)) if values else None
+
+
+def aggregate(results, by=GROUP_KEYS):
+    """
+    Summarize runs per configuration group: mean delivery rate, recovery rate,
+    hops, energy, detection rate and false positives over all seeds.
+    Returns a list of dicts sorted by the group key.
+    """
+    groups = defaultdict(list)
+    for row in results:
+        if 'error' in row:
+            continue
+        groups[tuple(row.get(k) for k in by)].append(row)
+    summary = []
+    for key in sorted(groups, key=lambda k: tuple(str(x) for x in k)):
+        rows = groups[key]
+        entry = dict(zip(by, key))
+        entry.update({
+            'runs': len(rows),
+            'delivery_rate': _mean([r['delivery_rate'] for r in rows]),
+            'recovery_rate': _mean([float(r['recovered']) for r in rows]),
+            'mean_hops': _mean([r['mean_hops'] for r in rows]),
+            'energy_used': _mean([r['energy_used'] for r in rows]),
+            'detection_rate': _mean([r['detection_rate'] for r in rows]),
+            'false_positives': _mean([r['false_positives'] for r in rows]),
+        })
+        summary.append(entry)
+    return summary
+
+
+def run_experiments(configs, max_workers=None, log_level='quiet', on_result=None):
+    """Run every config in parallel; returns (per-run results, aggregate summary)."""
+    results = []
+    for row in iter_results(configs, max_workers=max_workers, log_level=log_level):
+        results.append(row)
+        if on_result is not None:
+            on_result(row)
+    return results, aggregate(results)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Monte Carlo sweep over seeds and topologies")
+    parser.add_argument('--runs', type=int, default=20, help="seeds per configuration")
+    parser.add_argument('--nodes', type=int, nargs='+', default=[30])
+    parser.add_argument('--t', type=int, nargs='+', default=[3])
+    parser.add_argument('--fractions', type=float, nargs='+', default=[0.0, 0.1])
+    parser.add_argument('--behaviors', nargs='+', default=['no_response', 'delay'])
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    grid = build_grid(range(args.runs), num_nodes=args.nodes, t=args.t,
+                      malicious_fraction=args.fractions, behavior=args.behaviors)
+    t0 = time.perf_counter()
+    results, summary = run_experiments(grid, max_workers=args.workers)
+    print(f"{len(results)} runs in {time.perf_counter() - t0:.1f}s")
+    for entry in summary:
+        print(entry)
@@ -1,34 +1,57 @@
-import time
 import hashlib
-from collections import defaultdict
-import threading
+from collections import defaultdict, Counter
+
+import numpy as np
 
 import math
+import logging
+from Initialization.neighbor_index import get_neighbor_index
+from Initialization.sink_routes import get_sink_routes
+from Initialization.sim_log import get_logger
+from Message_Transmission.simulation_context import default_context, get_context
+from Message_Transmission.relay_scoring import score_relays, rank_relays, node_energies
+
+logger = get_logger('malicious')
 
 def euclidean_distance(loc1, loc2):
     return math.sqrt((loc1[0] - loc2[0])**2 + (loc1[1] - loc2[1])**2)
 
-def send_message(u, v, message):
-    print(f"[SEND] {u.node_id} -> {v.node_id} (MSG id={message['id']})")
+def send_message(u, v, message, scheduler=None, context=None):
+    logger.debug("[SEND] %s -> %s (MSG id=%s)", u.node_id, v.node_id, message['id'])
+    context = get_context(context)
+    context.count('send')
     # energy cost per send (constant)
     COST_PER_SEND = 10.0
+    # deliveries are events on the (virtual-clock) scheduler
+    if scheduler is None:
+        scheduler = context.scheduler
 
     if not hasattr(u, 'last_sent_time'):
         u.last_sent_time = {}
-    u.last_sent_time[v.node_id] = time.time()
+    u.last_sent_time[v.node_id] = scheduler.now
 
     # deduct energy from sender via consume_energy if available
     if hasattr(u, 'consume_energy'):
         try:
             u.consume_energy(COST_PER_SEND)
-            print(f"Node {u.node_id} energy reduced by {COST_PER_SEND}. New energy: {getattr(u, 'initial_energy', 'unknown')}")
+            logger.debug("Node %s energy reduced by %s. New energy: %s", u.node_id, COST_PER_SEND, getattr(u, 'initial_energy', 'unknown'))
         except Exception:
-            print(f"Warning: couldn't update energy for Node {u.node_id}")
+            logger.warning("Warning: couldn't update energy for Node %s", u.node_id)
 
     # Deliver message to receiver unless the receiver is malicious and configured
     # to not respond within the TD window.
+    delivered = message.copy()
+    # a new send supersedes a delivery still in flight to v (e.g. a delayed one),
+    # so a stale copy can never overwrite a newer message later on
+    pending = getattr(v, 'pending_delivery', None)
+    if pending is not None:
+        # cancel through the scheduler that owns the handle
+        pending[0].cancel(pending[1])
+    v.pending_delivery = None
+
     def _deliver():
-        v.last_received_message = message.copy()
+        v.last_received_message = delivered
+        v.pending_delivery = None
 
     # If the receiver is marked malicious, it can either not respond at all or
     # delay the response beyond the TD window.
@@ -36,24 +59,25 @@ def send_message(u, v, message):
         behavior = getattr(v, 'malicious_behavior', 'no_response')
         if behavior == 'no_response':
             # do not set last_received_message -> forward_and_monitor will time out
-            print(f"Node {v.node_id} is malicious (no_response): not delivering message to it")
+            logger.debug("Node %s is malicious (no_response): not delivering message to it", v.node_id)
         elif behavior == 'delay':
             delay = getattr(v, 'malicious_response_delay', None)
             if delay is None:
                 # default: delay longer than typical TD so it times out
                 delay = 10.0
-            print(f"Node {v.node_id} is malicious (delay): will deliver after {delay}s")
-            t = threading.Thread(target=lambda: (time.sleep(delay), _deliver()), daemon=True)
-            t.start()
+            logger.debug("Node %s is malicious (delay): will deliver after %ss", v.node_id, delay)
+            v.pending_delivery = (scheduler, scheduler.schedule(delay, _deliver))
         else:
             # unknown behavior - deliver normally but warn
-            print(f"Warning: unknown malicious behavior '{behavior}' for Node {v.node_id}. Delivering normally.")
-            _deliver()
+            logger.warning("Warning: unknown malicious behavior '%s' for Node %s. Delivering normally.", behavior, v.node_id)
+            v.pending_delivery = (scheduler, scheduler.schedule(0.0, _deliver))
     else:
-        _deliver()
+        v.pending_delivery = (scheduler, scheduler.schedule(0.0, _deliver))
 
-suspicious_nodes = set()
-node_reputation = defaultdict(lambda: {'gamma': 1, 'k': 0, 'pv': 1.0})
+# aliases of the default context's state, kept for existing importers; runs that
+# pass their own SimulationContext never touch these
+suspicious_nodes = default_context.suspicious_nodes
+node_reputation = default_context.node_reputation
 
 
 def compute_hash(data):
@@ -61,106 +85,145 @@ def compute_hash(data):
     return hashlib.sha256(str(data).encode()).hexdigest()
 
 
-def forward_and_monitor(u, v, message, TD, all_nodes, sink):
-    # Attempt to send to v and, on failure, retry alternative neighbors.
-    # Returns: node_id of the node that actually received and accepted the message,
-    # or None if all attempts fail.
-    original_signature = (message['id'], message['TS'], tuple(message.get('path*', [])))
-    message_hash = compute_hash(original_signature)
-    message['hash'] = message_hash
+def message_signature_hash(message):
+    signature = (message.get('id'), message.get('TS'), tuple(message.get('path*', [])))
+    return compute_hash(signature)
+
 
+def count_forward_to_malicious(u, target, context=None):
     # ensure per-sender forward-to-malicious counter exists
     if not hasattr(u, 'frwd_data_cnt'):
         try:
             u.frwd_data_cnt = defaultdict(int)
         except Exception:
             u.frwd_data_cnt = {}
+    # increment counter if target is known malicious
+    if getattr(target, 'malicious', False):
+        try:
+            u.frwd_data_cnt[target.node_id] += 1
+        except Exception:
+            u.frwd_data_cnt[target.node_id] = u.frwd_data_cnt.get(target.node_id, 0) + 1
+        get_context(context).count('forward_to_malicious')
+        logger.debug("frwd_data_cnt for Node %s -> target %s = %s", u.node_id, target.node_id, u.frwd_data_cnt[target.node_id])
+
+
+def check_response(u, target, message, message_hash, sink, all_nodes, context=None):
+    """Return True if target holds an untampered copy; otherwise mark it suspicious."""
+    context = get_context(context)
+    response = getattr(target, 'last_received_message', None)
+    if response:
+        if message_signature_hash(response) == message_hash:
+            return True
+        context.count('tampered')
+        logger.info("Node %s sent tampered message. Marked as suspicious.", target.node_id)
+    else:
+        context.count('timeout')
+        logger.info("Node %s did not respond within TD. Marked as suspicious.", target.node_id)
+    mark_suspicious(u, target, message, sink, all_nodes, context=context)
+    return False
+
+
+def rank_alternatives(u, message, tried, all_nodes, sink, index, k=None, weights=None):
+    """
+    Fallback relays for u, best IF score first, excluding tried nodes, path*,
+    non-sensor nodes and known malicious nodes. All candidates are scored in
+    one vectorized pass, so retries take the next entry instead of rescanning.
+    """
+    # select alternative candidates excluding tried nodes, path*, suspicious, and known malicious
+    u_radius = getattr(u, 'communication_radius', 0)
+    path_star = message.get('path*', [])
+    candidates = []
+    for cand_id, dist_uv in index.query(u.location, u_radius, exclude=u.node_id):
+        if cand_id in tried or cand_id in path_star:
+            continue
+        cand = all_nodes.get(cand_id)
+        if cand is None or not hasattr(cand, 'initial_energy'):
+            continue
+        if getattr(cand, 'malicious', False):
+            continue
+        # must be within mutual communication range
+        if dist_uv > min(u_radius, getattr(cand, 'communication_radius', 0)):
+            continue
+        candidates.append(cand)
+    if not candidates:
+        return []
+
+    path = message.get('path', [])
+    scores = score_relays(
+        u.location,
+        [c.location for c in candidates],
+        node_energies(candidates, getattr(sink, 'node_store', None)),
+        sink.location,
+        in_path=[c.node_id in path for c in candidates],
+        L=100,
+        weights=weights,
+    )
+    return [candidates[i].node_id for i in rank_relays(scores, k=k)]
+
+
+def forward_and_monitor(u, v, message, TD, all_nodes, sink, scheduler=None, context=None):
+    # Attempt to send to v and, on failure, retry alternative neighbors.
+    # Returns: node_id of the node that actually received and accepted the message,
+    # or None if all attempts fail.
+    # The TD wait advances the scheduler's virtual clock instead of sleeping.
+    # Suspicions and reputations go to `context` (default_context when None).
+    context = get_context(context)
+    if scheduler is None:
+        scheduler = context.scheduler
+    message_hash = message_signature_hash(message)
+    message['hash'] = message_hash
 
+    index = get_neighbor_index(sink, all_nodes)
     tried = set()
+    ranked = None
     target = v
     max_retries = 3
     attempt = 0
 
     while attempt < max_retries:
-        # increment counter if target is known malicious
-        if getattr(target, 'malicious', False):
-            try:
-                u.frwd_data_cnt[target.node_id] += 1
-            except Exception:
-                u.frwd_data_cnt[target.node_id] = u.frwd_data_cnt.get(target.node_id, 0) + 1
-            print(f"frwd_data_cnt for Node {u.node_id} -> target {target.node_id} = {u.frwd_data_cnt[target.node_id]}")
-
-        send_message(u, target, message)
-        time.sleep(TD)
-
-        response = getattr(target, 'last_received_message', None)
-        if response:
-            returned_signature = (response.get('id'), response.get('TS'), tuple(response.get('path*', [])))
-            returned_hash = compute_hash(returned_signature)
-            if returned_hash == message_hash:
-                # success
-                return target.node_id
-            else:
-                print(f"Node {target.node_id} sent tampered message. Marked as suspicious.")
-                mark_suspicious(u, target, message, sink, all_nodes)
-        else:
-            print(f"Node {target.node_id} did not respond within TD. Marked as suspicious.")
-            mark_suspicious(u, target, message, sink, all_nodes)
+        count_forward_to_malicious(u, target, context=context)
+
+        send_message(u, target, message, scheduler=scheduler, context=context)
+        scheduler.advance(TD)
+
+        if check_response(u, target, message, message_hash, sink, all_nodes, context=context):
+            # success; send this hop's reports and reputation changes in one batch
+            flush_hop_updates(context, all_nodes, sink, now=scheduler.now)
+            return target.node_id
 
         tried.add(target.node_id)
         attempt += 1
-
-        # select alternative candidate excluding tried nodes, path*, suspicious, and known malicious
-        candidates = []
-        L = 100
-        for cand in all_nodes.values():
-            if cand.node_id == u.node_id:
-                continue
-            if cand.node_id in tried:
-                continue
-            if cand.node_id in message.get('path*', []):
-                continue
-            if not hasattr(cand, 'initial_energy'):
-                continue
-            if getattr(cand, 'malicious', False):
-                continue
-            # must be within mutual communication range
-            dist_uv = euclidean_distance(u.location, cand.location)
-            if dist_uv > min(getattr(u, 'communication_radius', 0), getattr(cand, 'communication_radius', 0)):
-                continue
-            # compute a simple IF-like score
-            dvjs = euclidean_distance(cand.location, sink.location)
-            if dvjs == 0:
-                dvjs = 1e-6
-            pa = 2 if cand.node_id in message.get('path', []) else 1
-            energy_term = getattr(cand, 'initial_energy', 1.0) / (dist_uv * 0.1 + L * 0.01)
-            distance_term = 1.0 / (dvjs ** 2)
-            IF = pa * energy_term * distance_term
-            candidates.append((cand.node_id, IF))
-
-        if not candidates:
+        if attempt >= max_retries:
             break
 
-        # pick best candidate by IF
-        candidates.sort(key=lambda x: x[1], reverse=True)
-        best_id = candidates[0][0]
+        # rank fallback relays once; later retries take the next-best entry
+        if ranked is None:
+            ranked = iter(rank_alternatives(u, message, tried, all_nodes, sink, index, k=max_retries))
+        best_id = next((c for c in ranked if c not in tried), None)
+        if best_id is None:
+            break
         target = all_nodes[best_id]
 
     # all attempts exhausted, report original v as suspicious (already marked during attempts)
-    print(f"All attempts to forward from Node {u.node_id} failed. Giving up.")
+    context.count('forward_failed')
+    logger.info("All attempts to forward from Node %s failed. Giving up.", u.node_id)
+    flush_hop_updates(context, all_nodes, sink, now=scheduler.now)
     return None
 
 
-def mark_suspicious(u, v, message, sink, all_nodes):
-    suspicious_nodes.add(v.node_id)
+def mark_suspicious(u, v, message, sink, all_nodes, context=None):
+    context = get_context(context)
+    context.suspicious_nodes.add(v.node_id)
+    context.count('suspicious')
     anomaly_report = {
         "type": "Anomaly",
         "IDv": v.node_id,
         "Lov": v.location,
         "TS": message['TS']
     }
-    # forward the anomaly report to the sink for logging/routing
-    forward_report_to_sink(u, anomaly_report, v, all_nodes, sink)
+    # coalesce into the current report window; the batch is routed to the sink
+    # and applied to the reputation store by flush_anomaly_reports
+    buffer_anomaly_report(u, anomaly_report, context=context)
     # update node-level counters
     try:
         v.suspicious_count = getattr(v, 'suspicious_count', 0) + 1
@@ -171,54 +234,166 @@ def mark_suspicious(u, v, message, sink, all_nodes):
     except Exception:
         pass
 
-    # update reputation immediately based on this single report and broadcast
+
+def buffer_anomaly_report(reporter, report, context=None):
+    """Add one anomaly report to the context's buffer entry for report['IDv']."""
+    context = get_context(context)
+    ts = report.get('TS')
+    entry = context.anomaly_buffer.get(report['IDv'])
+    if entry is None:
+        entry = {'count': 0, 'Lov': report.get('Lov'), 'TS': (ts, ts), 'reporters': Counter()}
+        context.anomaly_buffer[report['IDv']] = entry
+    elif ts is not None:
+        lo, hi = entry['TS']
+        entry['TS'] = (ts if lo is None else min(lo, ts), ts if hi is None else max(hi, ts))
+    entry['count'] += 1
+    entry['reporters'][reporter.node_id] += 1
+    context.count('anomaly_reports')
+
+
+def flush_anomaly_reports(context, all_nodes, sink, now=None):
+    """
+    Send the buffered anomaly reports: one compact batch per reporter (a list
+    of {IDv, count, Lov, TS range}) through forward_report_to_sink, then one
+    bulk reputation update at the sink. With context.report_window set, calls
+    closer than that (virtual time `now`) keep the reports buffered.
+    Returns the number of report batches forwarded.
+    """
+    context = get_context(context)
+    buffer = context.anomaly_buffer
+    if not buffer:
+        return 0
+    window = context.report_window
+    if window and now is not None and context.last_report_flush is not None and now - context.last_report_flush < window:
+        return 0
+    context.last_report_flush = now
+    entries = list(buffer.items())
+    buffer.clear()
+
+    batches = defaultdict(list)
+    for node_id, entry in entries:
+        for reporter_id, c in entry['reporters'].items():
+            batches[reporter_id].append({'IDv': node_id, 'count': c, 'Lov': entry['Lov'], 'TS': entry['TS']})
+    for reporter_id, batch in batches.items():
+        reporter = all_nodes.get(reporter_id)
+        if reporter is None:
+            continue
+        report = {"type": "AnomalyBatch", "reports": batch}
+        # route around every node currently under suspicion
+        forward_report_to_sink(reporter, report, None, all_nodes, sink, avoid=context.suspicious_nodes, context=context)
+    context.count('report_batches', len(batches))
+
+    # the sink applies every report of the window in one vectorized update
     try:
-        update_reputation(sink, [anomaly_report])
-        # reflect updated reputation on the node object if entry exists
-        try:
-            rep = node_reputation.get(v.node_id, None)
-            if rep is not None:
-                setattr(v, 'reputation', rep.get('pv', getattr(v, 'reputation', 1.0)))
-        except Exception:
-            pass
-        broadcast_reputation_updates()
+        apply_reputation_counts(sink, {node_id: entry['count'] for node_id, entry in entries}, context=context)
     except Exception as e:
-        print(f"Warning: failed to update/broadcast reputations: {e}")
+        logger.warning("Warning: failed to update reputations: %s", e)
+    return len(batches)
 
 
-def forward_report_to_sink(start_node, report, avoid_node, all_nodes, sink):
-    
-    current_node = start_node
-    path = [current_node.node_id]
-    while current_node and current_node.node_id != 'sink':
-        neighbors = [n for n in all_nodes.values() if n.node_id not in path and n.node_id != avoid_node.node_id and 
-                     euclidean_distance(current_node.location, n.location) <= current_node.communication_radius]
-        if not neighbors:
-            print("No route to sink available avoiding suspicious node.")
-            return
-        next_node = min(neighbors, key=lambda x: euclidean_distance(x.location, sink.location))
-        path.append(next_node.node_id)
-        current_node = next_node
-    print(f"Anomaly report sent to Sink via path: {path}")
-
-
-def update_reputation(sink, reports):
-    for report in reports:
-        node_id = report['IDv']
-        node_reputation[node_id]['gamma'] += 1
-        node_reputation[node_id]['k'] += 1
-        gamma = node_reputation[node_id]['gamma']
-        k = node_reputation[node_id]['k']
-        node_reputation[node_id]['pv'] = gamma ** (-k)
-    # Note: updating node_reputation dict only. Individual node objects are updated
-    # by callers (e.g., mark_suspicious) if they have access to the node object.
-
-
-def broadcast_reputation_updates():
-    print("Broadcasting updated reputations:")
-    for node_id, rep in node_reputation.items():
-        print(f"Node {node_id}: Reputation pv = {rep['pv']:.4f}")
-    print("completed!")
+def flush_hop_updates(context, all_nodes, sink, now=None):
+    """End-of-hop batch: forward buffered anomaly reports, then broadcast reputation deltas."""
+    flush_anomaly_reports(context, all_nodes, sink, now=now)
+    broadcast_reputation_updates(context=context, all_nodes=all_nodes, now=now)
+
+
+def forward_report_to_sink(start_node, report, avoid_node, all_nodes, sink, avoid=None, mode='greedy', context=None):
+    """
+    Route an anomaly report from start_node to the sink, never through
+    avoid_node or any id in `avoid`. Next hops come from the sink's cached
+    SinkRouteTable ('greedy': closest to the sink first, 'shortest': fewest
+    hops first), so a report costs O(hops). Returns the path, or None.
+    """
+    routes = get_sink_routes(sink, all_nodes)
+    exclude = (avoid_node.node_id,) if avoid_node is not None else ()
+    path = routes.route(start_node.node_id, avoid=avoid or (), mode=mode, exclude=exclude)
+    if path is None:
+        logger.info("No route to sink available avoiding suspicious node.")
+        return None
+    get_context(context).count('anomaly_report')
+    logger.debug("Anomaly report sent to Sink via path: %s", path)
+    return path
+
+
+def update_reputation(sink, reports, context=None):
+    counts = Counter(report['IDv'] for report in reports)
+    apply_reputation_counts(sink, counts, context=context)
+
+
+def apply_reputation_counts(sink, counts, context=None):
+    """
+    Bulk reputation update for {node_id: number of reports}. c reports against
+    a node are equivalent to c single updates (gamma += 1, k += 1 each), i.e.
+    gamma += c, k += c, pv = gamma ** (-k), computed for all nodes at once.
+    """
+    context = get_context(context)
+    if not counts:
+        return
+    node_reputation = context.node_reputation
+    ids = list(counts)
+    entries = [node_reputation[node_id] for node_id in ids]
+    c = np.fromiter((counts[node_id] for node_id in ids), dtype=np.int64, count=len(ids))
+    gamma = np.fromiter((e['gamma'] for e in entries), dtype=np.int64, count=len(ids)) + c
+    k = np.fromiter((e['k'] for e in entries), dtype=np.int64, count=len(ids)) + c
+    pv = gamma.astype(float) ** (-k.astype(float))
+    for node_id, entry, g, kk, p in zip(ids, entries, gamma.tolist(), k.tolist(), pv.tolist()):
+        entry['gamma'] = g
+        entry['k'] = kk
+        entry['pv'] = p
+        # new version, published as a delta by the next broadcast
+        context.reputation_versions[node_id] += 1
+        context.reputation_dirty.add(node_id)
+    # Note: updating node_reputation dict only. Node objects receive the change
+    # through broadcast_reputation_updates / apply_reputation_updates.
+
+
+def apply_reputation_updates(delta, all_nodes, applied=None):
+    """
+    Apply a published delta {node_id: (version, pv)} to the node objects.
+    With an `applied` dict (node_id -> version), stale or repeated versions are
+    skipped, so deltas can be applied more than once or out of order.
+    """
+    for node_id, (version, pv) in delta.items():
+        if applied is not None:
+            if applied.get(node_id, 0) >= version:
+                continue
+            applied[node_id] = version
+        node = all_nodes.get(node_id)
+        if node is not None:
+            try:
+                node.reputation = pv
+            except Exception:
+                pass
+
+
+def broadcast_reputation_updates(context=None, all_nodes=None, now=None):
+    """
+    Publish only the reputation entries changed since the last broadcast, as
+    {node_id: (version, pv)}, and apply them to all_nodes when given. Costs
+    O(changed entries) rather than O(table). With context.broadcast_interval set,
+    calls closer than that (virtual time `now`) keep the deltas pending.
+    Returns the published delta ({} if nothing was sent).
+    """
+    context = get_context(context)
+    if not context.reputation_dirty:
+        return {}
+    interval = context.broadcast_interval
+    if interval and now is not None and context.last_broadcast is not None and now - context.last_broadcast < interval:
+        return {}
+    context.last_broadcast = now
+    node_reputation = context.node_reputation
+    versions = context.reputation_versions
+    delta = {node_id: (versions[node_id], node_reputation[node_id]['pv']) for node_id in context.reputation_dirty}
+    context.reputation_dirty.clear()
+    context.count('reputation_broadcast')
+    context.count('reputation_deltas', len(delta))
+    if all_nodes is not None:
+        apply_reputation_updates(delta, all_nodes, context.applied_versions)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Broadcasting %d reputation update(s):", len(delta))
+        for node_id, (version, pv) in delta.items():
+            logger.debug("Node %s: Reputation pv = %.4f (v%d)", node_id, pv, version)
+    return delta
 
 
 def mark_node_as_malicious(node, behavior='no_response', delay=None):
@@ -245,4 +420,4 @@ def mark_node_as_malicious(node, behavior='no_response', delay=None):
         node.suspicious_count = getattr(node, 'suspicious_count', 0) + 1
     except Exception:
         pass
-    print(f"Node {node.node_id} marked malicious: behavior={behavior}, delay={delay}")
+    logger.info("Node %s marked malicious: behavior=%s, delay=%s", node.node_id, behavior, delay)
@@ -0,0 +1,133 @@
+import os
+import csv
+import time
+import atexit
+import queue
+import threading
+
+from Message_Transmission.columnar_metrics import ColumnarMetricsWriter
+
+NODE_METRICS_FIELDS = ['node_id', 'energy', 'dist_to_sink_node', 'reputation', 'anomaly_count', 'suspicious_count', 'neighbour_count']
+
+
+class MetricsWriter:
+    """
+    Persistent, buffered CSV sink for per-hop node snapshots.
+
+    The file is opened once (append mode; the header is written only if the
+    file is empty or lacks one) and rows are batched in memory. A batch is
+    written when it reaches flush_rows rows or flush_interval seconds have
+    passed since the last flush. With background=True batches are handed to a
+    writer thread so the simulation never blocks on file I/O.
+    Has the csv.DictWriter writerow/writerows interface; extra keys are ignored.
+    """
+
+    def __init__(self, path, fieldnames=None, flush_rows=1000, flush_interval=5.0, background=False):
+        self.path = path
+        self.fieldnames = list(fieldnames or NODE_METRICS_FIELDS)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self._rows = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a+', newline='')
+        self._file.seek(0)
+        first = self._file.readline()
+        self._file.seek(0, os.SEEK_END)
+        self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames, extrasaction='ignore')
+        # crude check: header contains the first field name
+        if not first or self.fieldnames[0] not in first:
+            self._writer.writeheader()
+
+        self._queue = None
+        self._thread = None
+        if background:
+            self._queue = queue.Queue()
+            self._thread = threading.Thread(target=self._drain, daemon=True)
+            self._thread.start()
+
+    def _write(self, rows):
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def _drain(self):
+        while True:
+            rows = self._queue.get()
+            if rows is None:
+                break
+            self._write(rows)
+
+    def writerow(self, row):
+        with self._lock:
+            self._rows.append(row)
+            due = (len(self._rows) >= self.flush_rows or
+                   (self.flush_interval is not None and time.monotonic() - self._last_flush >= self.flush_interval))
+        if due:
+            self.flush()
+
+    def writerows(self, rows):
+        for row in rows:
+            self.writerow(row)
+
+    def flush(self):
+        with self._lock:
+            rows, self._rows = self._rows, []
+            self._last_flush = time.monotonic()
+        if not rows or self._closed:
+            return
+        if self._queue is not None:
+            self._queue.put(rows)
+        else:
+            self._write(rows)
+
+    def close(self):
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+_open_writers = {}
+
+
+def get_metrics_writer(path, metrics_format='csv', **kwargs):
+    """
+    Return the shared snapshot writer for path, opening it on first use:
+    a MetricsWriter for metrics_format='csv', a ColumnarMetricsWriter for
+    'npy' (directory of row-group files) or 'parquet' (needs pyarrow).
+    """
+    key = os.path.abspath(path)
+    writer = _open_writers.get(key)
+    if writer is None or writer._closed:
+        if metrics_format == 'csv':
+            writer = MetricsWriter(path, **kwargs)
+        elif metrics_format in ('npy', 'parquet'):
+            writer = ColumnarMetricsWriter(path, format=metrics_format, **kwargs)
+        else:
+            raise ValueError(f"unknown metrics_format {metrics_format!r}; choose 'csv', 'npy' or 'parquet'")
+        _open_writers[key] = writer
+    return writer
+
+
+def close_metrics_writers():
+    for writer in list(_open_writers.values()):
+        writer.close()
+    _open_writers.clear()
+
+
+atexit.register(close_metrics_writers)
@@ -1,22 +1,41 @@
 import sys
 import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-import random
 import math
 import time
-import csv
 import string
+import logging
 from Initialization.network import initialize_network
 from Initialization.nodeStructure import SensorNode, SinkNode
+from Initialization.neighbor_index import get_neighbor_index
+from Initialization.sim_log import get_logger
 
-from Message_Transmission.malicious_node_management import forward_and_monitor, suspicious_nodes, node_reputation
+from Message_Transmission.malicious_node_management import forward_and_monitor, flush_hop_updates, suspicious_nodes, node_reputation
+from Message_Transmission.simulation_context import get_context
+from Message_Transmission.relay_scoring import score_relays, rank_relays
+from Message_Transmission.metrics_writer import get_metrics_writer
+
+logger = get_logger('msgtrans')
+# Per-query / per-step diagnostics for this module; toggle with set_debug()
+DEBUG = False
+
+
+def set_debug(enabled):
+    """
+    Force per-query output for this module (DEBUG level) regardless of the
+    configured simulation level; set_debug(False) defers to it again.
+    """
+    global DEBUG
+    DEBUG = bool(enabled)
+    logger.setLevel(logging.DEBUG if DEBUG else logging.NOTSET)
 
 
 def euclidean_distance(loc1, loc2):
     return math.sqrt((loc1[0] - loc2[0]) ** 2 + (loc1[1] - loc2[1]) ** 2)
 
-def send_message(sender, receiver, message):
-    print(f"[SEND] {sender.node_id} -> {receiver.node_id} (MSG id={message['id']})")
+def send_message(sender, receiver, message, context=None):
+    logger.debug("[SEND] %s -> %s (MSG id=%s)", sender.node_id, receiver.node_id, message['id'])
+    get_context(context).count('send')
     # energy cost per send (constant)
     COST_PER_SEND = 10.0
 
@@ -30,9 +49,9 @@ def send_message(sender, receiver, message):
     if hasattr(sender, 'consume_energy'):
         try:
             sender.consume_energy(COST_PER_SEND)
-            print(f"Node {sender.node_id} energy reduced by {COST_PER_SEND}. New energy: {getattr(sender, 'initial_energy', 'unknown')}")
+            logger.debug("Node %s energy reduced by %s. New energy: %s", sender.node_id, COST_PER_SEND, getattr(sender, 'initial_energy', 'unknown'))
         except Exception:
-            print(f"Warning: couldn't update energy for Node {sender.node_id}")
+            logger.warning("Warning: couldn't update energy for Node %s", sender.node_id)
 
     # deliver message copy to receiver
     receiver.last_received_message = message.copy()
@@ -46,34 +65,59 @@ def decrypt(ciphertext):
 def ET(d, L): 
     return d * 0.1 + L * 0.01
 
-def step1_send_query(node_u, message, neighbor_nodes, Du):
-    print("\n--- Step 1: Sending Queries ---")
+def find_neighbors(current_node, message, all_nodes, index):
+    """
+    Sensor nodes within mutual communication range of current_node that are not
+    already on message['path*'], looked up through the shared neighbor index.
+    """
+    neighbors = []
+    path_star = message['path*']
+    for node_id, dist in index.query(current_node.location, current_node.communication_radius, exclude=current_node.node_id):
+        if node_id in path_star:
+            continue
+        node = all_nodes.get(node_id)
+        # skip sink / non-sensor nodes
+        if node is None or not hasattr(node, 'initial_energy'):
+            continue
+        if dist <= min(current_node.communication_radius, node.communication_radius):
+            neighbors.append(node)
+    return neighbors
+
+def step1_send_query(node_u, message, neighbor_nodes, Du, rng=None, context=None):
+    context = get_context(context)
+    if rng is None:
+        rng = context.rng
+    logger.debug("\n--- Step 1: Sending Queries ---")
     queries = {}
     for v in neighbor_nodes:
         # ensure both nodes can reach each other: distance <= min(u.radius, v.radius)
         dist_uv = euclidean_distance(node_u.location, v.location)
         effective_range = min(node_u.communication_radius, v.communication_radius)
         if v.node_id not in message['path*'] and dist_uv <= effective_range:
-            alpha_j = random.randint(1, 100)
+            alpha_j = rng.randint(1, 100)
             query = {
                 'IDu': node_u.node_id,
                 'g_alpha_j': alpha_j,
                 'TS': message['TS']
             }
             queries[v.node_id] = query
-            print(f"Query sent from Node {node_u.node_id} to Node {v.node_id}: {query}")
+            logger.debug("Query sent from Node %s to Node %s: %s", node_u.node_id, v.node_id, query)
+    context.count('query', len(queries))
     return queries
 
-def step2_neighbors_respond(queries, sink_location, all_nodes):
-    print("\n--- Step 2: Neighbors Responding ---")
+def step2_neighbors_respond(queries, sink_location, all_nodes, rng=None, context=None):
+    context = get_context(context)
+    if rng is None:
+        rng = context.rng
+    logger.debug("\n--- Step 2: Neighbors Responding ---")
     responses = {}
     for v_id, q in queries.items():
         v = all_nodes[v_id]
         # skip non-sensor nodes (e.g., sink) which don't have initial_energy
         if not hasattr(v, 'initial_energy'):
-            print(f"Skipping node {v_id} in responses (no initial_energy)")
+            logger.debug("Skipping node %s in responses (no initial_energy)", v_id)
             continue
-        beta_j = random.randint(1, 100)
+        beta_j = rng.randint(1, 100)
         g_beta_j = beta_j
         g_alpha_beta_j = q['g_alpha_j'] * beta_j
 
@@ -84,11 +128,12 @@ def step2_neighbors_respond(queries, sink_location, all_nodes):
             'g_beta_j': g_beta_j
         }
         responses[v_id] = response
-        print(f"Response from Node {v.node_id}: {response}")
+        logger.debug("Response from Node %s: %s", v.node_id, response)
+    context.count('response', len(responses))
     return responses
 
 def step3_decrypt_and_collect(responses, queries):
-    print("\n--- Step 3: Decrypting and Collecting Responses ---")
+    logger.debug("\n--- Step 3: Decrypting and Collecting Responses ---")
     metrics = {}
     for v_id, res in responses.items():
         decrypted = decrypt(res['ciphertext'])
@@ -99,38 +144,47 @@ def step3_decrypt_and_collect(responses, queries):
             'dvjs': float(parts[2]),
             'TS': parts[3]
         }
-        print(f"Decrypted Data from Node {v_id}: {metrics[v_id]}")
+        logger.debug("Decrypted Data from Node %s: %s", v_id, metrics[v_id])
     return metrics
 
-def step4_select_relay(metrics, node_u, message, all_nodes, L, lambda_val=2):
-    print("\n--- Step 4: Selecting Relay Node ---")
-    IF_values = {}
-    for v_id, m in metrics.items():
-        v = all_nodes[v_id]
-        duvj = euclidean_distance(node_u.location, v.location)
-
-        pvj = 1
-        pa = lambda_val if v_id in message['path'] else 1
-        energy_term = m['energy'] / ET(duvj, L)
-        distance_term = 1 / (m['dvjs'] ** 2)
-        IF = pvj * pa * energy_term * distance_term
-
-        IF_values[v_id] = IF
-        print(f"Node {v_id}: IF value = {IF}")
-
-    best_node = max(IF_values, key=IF_values.get)
-    print(f"Selected Relay Node: {best_node} with IF value: {IF_values[best_node]}")
+def step4_select_relay(metrics, node_u, message, all_nodes, L, lambda_val=2, weights=None, context=None):
+    logger.debug("\n--- Step 4: Selecting Relay Node ---")
+    # score every responding neighbor in one vectorized IF computation
+    ids = list(metrics.keys())
+    scores = score_relays(
+        node_u.location,
+        [all_nodes[v_id].location for v_id in ids],
+        [metrics[v_id]['energy'] for v_id in ids],
+        None,
+        in_path=[v_id in message['path'] for v_id in ids],
+        L=L,
+        lambda_val=lambda_val,
+        weights=weights,
+        d_vs=[metrics[v_id]['dvjs'] for v_id in ids],
+    )
+    best = int(rank_relays(scores, k=1)[0])
+    best_node = ids[best]
+    if logger.isEnabledFor(logging.DEBUG):
+        for v_id, IF in zip(ids, scores.tolist()):
+            logger.debug("Node %s: IF value = %s", v_id, IF)
+    get_context(context).count('relay_selected')
+    logger.info("Selected Relay Node: %s with IF value: %s", best_node, float(scores[best]))
     return best_node
 
 def step5_forward_message(message, selected_node_id):
-    print("\n--- Step 5: Forwarding Message ---")
+    logger.debug("\n--- Step 5: Forwarding Message ---")
     new_message = message.copy()
     new_message['path*'].append(selected_node_id)
-    print(f"Message forwarded to Node {selected_node_id}. Path so far: {new_message['path*']}")
+    logger.debug("Message forwarded to Node %s. Path so far: %s", selected_node_id, new_message['path*'])
     return new_message
 
-def simulate_message_transmission(sensor_nodes=None, sink=None, positions=None, message_override=None, csv_writer=None, run_id=0, csv_path=None):
-    print("\n--- Simulation Start ---")
+def simulate_message_transmission(sensor_nodes=None, sink=None, positions=None, message_override=None, csv_writer=None, run_id=0, csv_path=None, scheduler=None, context=None, metrics_format='csv'):
+    logger.debug("\n--- Simulation Start ---")
+    # suspicions, reputations, query RNG and scheduler come from the run's context
+    context = get_context(context)
+    # all sends, deliveries and TD timeouts run on one virtual-clock scheduler
+    if scheduler is None:
+        scheduler = context.scheduler
 
     # allow caller to pass an existing network so node energy persists across multiple shares
     if sensor_nodes is None or sink is None or positions is None:
@@ -141,6 +195,7 @@ def simulate_message_transmission(sensor_nodes=None, sink=None, positions=None,
     # add sink to all_nodes if not present
     if getattr(sink, 'node_id', None) not in all_nodes:
         all_nodes[sink.node_id] = sink
+    index = get_neighbor_index(sink, all_nodes)
 
     # prepare message (allow caller override)
     if message_override is None:
@@ -172,20 +227,47 @@ def simulate_message_transmission(sensor_nodes=None, sink=None, positions=None,
     # helper to write CSV snapshots for sensor nodes at a hop (exclude sink)
     # Writes rows with the fields requested by the user:
     # node_id,energy,dist_to_sink_node,reputation,anomaly_count,suspicious_count,neighbour_count
+    neighbor_count_cache = {}
+
+    def sensor_neighbor_counts():
+        # neighbor counts only change with topology: cache per neighbor-index version
+        if neighbor_count_cache.get('version') != index.version:
+            counts = {}
+            for node_id, node in sensor_nodes.items():
+                counts[node_id] = sum(1 for other_id, _ in index.query(node.location, getattr(node, 'communication_radius', 0), exclude=node_id)
+                                      if other_id in sensor_nodes)
+            neighbor_count_cache['version'] = index.version
+            neighbor_count_cache['counts'] = counts
+        return neighbor_count_cache['counts']
+
+    def snapshot_columns():
+        # energy, distance, reputation and suspicious counts as array slices of the
+        # shared NodeStore; falls back to per-node attributes for foreign nodes
+        store = getattr(sink, 'node_store', None)
+        ids = list(sensor_nodes.keys())
+        if store is not None:
+            try:
+                idx = store.slots(ids)
+                return (ids, store.energy[idx].tolist(), store.distances_to(sink.location)[idx].tolist(),
+                        store.reputation[idx].tolist(), store.suspicious_count[idx].tolist())
+            except KeyError:
+                pass
+        nodes = [sensor_nodes[n] for n in ids]
+        return (ids, [getattr(n, 'initial_energy', '') for n in nodes],
+                [euclidean_distance(n.location, sink.location) for n in nodes],
+                [getattr(n, 'reputation', '') for n in nodes],
+                [getattr(n, 'suspicious_count', 0) for n in nodes])
+
     def write_snapshots(hop_index, writer=None):
         if writer is None:
             return
-        for node_id, node in sensor_nodes.items():
-            energy = getattr(node, 'initial_energy', '')
-            dist_to_sink = euclidean_distance(node.location, sink.location)
-            reputation = getattr(node, 'reputation', '')
-            suspicious_count = getattr(node, 'suspicious_count', 0)
-            # compute neighbor count
-            neighbor_count = 0
-            for other in sensor_nodes.values():
-                if other.node_id != node_id and euclidean_distance(node.location, other.location) <= getattr(node, 'communication_radius', 0):
-                    neighbor_count += 1
-
+        # rows carry run_id / hop / is_malicious for columnar sinks; writers that
+        # declare fieldnames (csv.DictWriter, MetricsWriter) only get their columns
+        fields = getattr(writer, 'fieldnames', None)
+        neighbor_counts = sensor_neighbor_counts()
+        ids, energies, dists, reputations, suspicious_counts = snapshot_columns()
+        for node_id, energy, dist_to_sink, reputation, suspicious_count in zip(ids, energies, dists, reputations, suspicious_counts):
+            node = sensor_nodes[node_id]
             # compute anomaly_count from frwd_data_cnt if present (sum of attempts), else fallback to anomaly_count attribute
             anomaly_count = 0
             frwd = getattr(node, 'frwd_data_cnt', None)
@@ -198,22 +280,46 @@ def simulate_message_transmission(sensor_nodes=None, sink=None, positions=None,
             else:
                 anomaly_count = getattr(node, 'anomaly_count', 0)
 
-            writer.writerow({
+            row = {
+                'run_id': run_id,
+                'hop': hop_index,
                 'node_id': node_id,
                 'energy': energy,
                 'dist_to_sink_node': dist_to_sink,
                 'reputation': reputation,
                 'anomaly_count': anomaly_count,
                 'suspicious_count': suspicious_count,
-                'neighbour_count': neighbor_count
-            })
+                'neighbour_count': neighbor_counts[node_id],
+                'is_malicious': getattr(node, 'is_malicious', False)
+            }
+            if fields is not None:
+                row = {k: row[k] for k in fields if k in row}
+            writer.writerow(row)
+
+    # Prepare the snapshot writer once per run: a caller-supplied writer, or the
+    # shared buffered MetricsWriter for csv_path (kept open across hops and runs).
+    # If caller didn't pass a writer or path, use a default file in Message_Transmission
+    # (node_metrics.csv, node_metrics_columnar for 'npy', node_metrics.parquet for 'parquet');
+    # csv_path=False disables snapshots (e.g. parallel experiment workers).
+    if csv_writer is None and csv_path is None:
+        default_name = {'csv': 'node_metrics.csv', 'npy': 'node_metrics_columnar',
+                        'parquet': 'node_metrics.parquet'}.get(metrics_format, 'node_metrics.csv')
+        csv_path = os.path.join(os.path.dirname(__file__), default_name)
+    csv_file_writer = csv_writer
+    if csv_file_writer is None and csv_path:
+        try:
+            csv_file_writer = get_metrics_writer(csv_path, metrics_format=metrics_format)
+        except Exception as e:
+            logger.warning("Warning: couldn't open csv_path %s for writing: %s", csv_path, e)
+            csv_file_writer = None
 
     while hop < max_hops:
-        print(f"\n--- Hop {hop + 1} ---")
-        print(f"Current Node: {current_node.node_id}")
+        context.count('hop')
+        logger.info("\n--- Hop %d ---", hop + 1)
+        logger.info("Current Node: %s", current_node.node_id)
         
         dist_to_sink = euclidean_distance(current_node.location, sink.location)
-        print(f"Distance to sink: {dist_to_sink}, Comm range: {current_node.communication_radius}")
+        logger.debug("Distance to sink: %s, Comm range: %s", dist_to_sink, current_node.communication_radius)
 
         # If the sink is within mutual communication range, forward directly to sink
         # and finish the transmission.
@@ -222,117 +328,50 @@ def simulate_message_transmission(sensor_nodes=None, sink=None, positions=None,
         except Exception:
             sink_radius = current_node.communication_radius
         if dist_to_sink <= min(current_node.communication_radius, sink_radius):
-            print("Sink is within range of Node {}. Forwarding message to sink.".format(current_node.node_id))
+            logger.info("Sink is within range of Node %s. Forwarding message to sink.", current_node.node_id)
             # perform the send (and monitoring) to sink using malicious manager
-            actual = forward_and_monitor(current_node, sink, message, TD=1.0, all_nodes=all_nodes, sink=sink)
+            actual = forward_and_monitor(current_node, sink, message, TD=1.0, all_nodes=all_nodes, sink=sink, scheduler=scheduler, context=context)
             if actual is None:
-                print("Forward to sink failed. Stopping transmission.")
+                logger.info("Forward to sink failed. Stopping transmission.")
                 break
             # append actual recipient (should be sink)
             message['path*'].append(actual)
-            print("Message reached the Sink Node!")
+            context.count('delivered')
+            logger.info("Message reached the Sink Node!")
             # finalize and break
             hop += 1
             break
 
         # write snapshot for this hop (before any forwarding)
-        # Prepare CSV writer if csv_path provided
-        csv_file = None
-        csv_file_writer = None
-        # if caller didn't pass a writer or path, use a default file in Message_Transmission
-        if csv_writer is None and csv_path is None:
-            csv_path = os.path.join(os.path.dirname(__file__), 'node_metrics.csv')
-
-        if csv_writer is not None:
-            csv_file_writer = csv_writer
-        elif csv_path is not None:
-            # open file in append mode and ensure header exists
-            fieldnames = ['node_id', 'energy', 'dist_to_sink_node', 'reputation', 'anomaly_count', 'suspicious_count', 'neighbour_count']
-            need_header = False
-            try:
-                # ensure directory exists
-                os.makedirs(os.path.dirname(csv_path), exist_ok=True)
-                exists = os.path.exists(csv_path)
-                csv_file = open(csv_path, 'a+', newline='')
-                csv_file.seek(0)
-                first = csv_file.readline()
-                if not first:
-                    need_header = True
-                else:
-                    # crude check: header contains 'node_id'
-                    if 'node_id' not in first:
-                        need_header = True
-                csv_file.seek(0, os.SEEK_END)
-                writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-                if need_header:
-                    writer.writeheader()
-                csv_file_writer = writer
-            except Exception as e:
-                print(f"Warning: couldn't open csv_path {csv_path} for writing: {e}")
-                csv_file_writer = None
-
         write_snapshots(hop, writer=csv_file_writer)
 
-        # close file handle if we opened it here
-        if csv_file is not None:
-            try:
-                csv_file.close()
-            except Exception:
-                pass
-
         
         # neighbor is valid only if both nodes are sensor nodes and within each other's communication radii
-        neighbors = []
-        for node_id, node in all_nodes.items():
-            if node_id == current_node.node_id or node_id in message['path*']:
-                continue
-            # skip sink / non-sensor nodes
-            if not hasattr(node, 'initial_energy'):
-                continue
-            dist = euclidean_distance(current_node.location, node.location)
-            if dist <= min(current_node.communication_radius, node.communication_radius):
-                neighbors.append(node)
-        # Detailed diagnostics: list candidates and exclusions
-        candidates = []
-        exclusions = []
-        for node_id, node in all_nodes.items():
-            if node_id == current_node.node_id:
-                continue
-            dist = euclidean_distance(current_node.location, node.location)
-            can_reach = dist <= min(current_node.communication_radius, node.communication_radius)
-            if can_reach:
-                if node_id in message['path*']:
-                    exclusions.append((node_id, dist))
-                else:
-                    candidates.append((node_id, dist))
-        # if candidates:
-        #     print(f"Candidates within mutual range (not in path*): {[ (n,d) for n,d in candidates ]}")
-        # if exclusions:
-        #     print(f"Reachable but excluded (in path*): {[ (n,d) for n,d in exclusions ]}")
+        neighbors = find_neighbors(current_node, message, all_nodes, index)
 
         if not neighbors:
-            print("No neighbors within range. Diagnostic info:")
+            logger.info("No neighbors within range of Node %s. Breaking the loop.", current_node.node_id)
             # show nearby nodes with distances and their radii for debugging
-            for node_id, node in all_nodes.items():
-                if node_id == current_node.node_id:
-                    continue
-                dist = euclidean_distance(current_node.location, node.location)
-                print(f" - Node {node_id}: dist={dist:.3f}, node.radius={node.communication_radius}, cur.radius={current_node.communication_radius}")
-            dist_sink = euclidean_distance(current_node.location, sink.location)
-            print(f" - Distance to sink: {dist_sink:.3f}, sink.radius={sink.communication_radius}")
-            print("Breaking the loop.")
+            if logger.isEnabledFor(logging.DEBUG):
+                for node_id, dist in index.query(current_node.location, 2 * current_node.communication_radius, exclude=current_node.node_id):
+                    node = all_nodes.get(node_id)
+                    if node is None:
+                        continue
+                    logger.debug(" - Node %s: dist=%.3f, node.radius=%s, cur.radius=%s", node_id, dist, node.communication_radius, current_node.communication_radius)
+                dist_sink = euclidean_distance(current_node.location, sink.location)
+                logger.debug(" - Distance to sink: %.3f, sink.radius=%s", dist_sink, sink.communication_radius)
             break
 
-        queries = step1_send_query(current_node, message, neighbors, current_node.communication_radius)
-        responses = step2_neighbors_respond(queries, sink.location, all_nodes)
+        queries = step1_send_query(current_node, message, neighbors, current_node.communication_radius, context=context)
+        responses = step2_neighbors_respond(queries, sink.location, all_nodes, context=context)
         metrics = step3_decrypt_and_collect(responses, queries)
-        selected_id = step4_select_relay(metrics, current_node, message, all_nodes, L=100)
+        selected_id = step4_select_relay(metrics, current_node, message, all_nodes, L=100, context=context)
 
         v = all_nodes[selected_id]
         # use forward_and_monitor to perform the actual send and monitoring (it calls send_message)
-        actual = forward_and_monitor(current_node, v, message, TD=1.0, all_nodes=all_nodes, sink=sink)
+        actual = forward_and_monitor(current_node, v, message, TD=1.0, all_nodes=all_nodes, sink=sink, scheduler=scheduler, context=context)
         if actual is None:
-            print("Forwarding failed for current hop. Stopping transmission.")
+            logger.info("Forwarding failed for current hop. Stopping transmission.")
             break
 
         message = step5_forward_message(message, actual)
@@ -341,16 +380,24 @@ def simulate_message_transmission(sensor_nodes=None, sink=None, positions=None,
 
     message['final_hop'] = current_node.node_id
     message['total_hops'] = hop + 1
+    # anomaly reports / reputation deltas still held back by a time window go out now
+    flush_hop_updates(context, all_nodes, sink)
+    # hand buffered snapshot rows to the file once per run (not per hop)
+    if csv_writer is None and csv_file_writer is not None:
+        csv_file_writer.flush()
     if hop >= max_hops:
-        print(f"Stopped because max_hops={max_hops} reached. Consider increasing max_hops or adjusting routing.")
+        logger.warning("Stopped because max_hops=%s reached. Consider increasing max_hops or adjusting routing.", max_hops)
     
-    # After transmission, print per-sender frwd_data_cnt summary (if present)
-    print("\n--- frwd_data_cnt summary (per sender) ---")
+    # After transmission, log per-sender frwd_data_cnt summary (if present)
+    verbose = logger.isEnabledFor(logging.DEBUG)
+    if verbose:
+        logger.debug("\n--- frwd_data_cnt summary (per sender) ---")
     frwd_summary = {}
     for node_id, node in sensor_nodes.items():
         cnt = getattr(node, 'frwd_data_cnt', None)
         if cnt is None:
-            print(f"Node {node_id} frwd_data_cnt: {{}}")
+            if verbose:
+                logger.debug("Node %s frwd_data_cnt: {}", node_id)
             frwd_summary[node_id] = {}
         else:
             try:
@@ -360,7 +407,8 @@ def simulate_message_transmission(sensor_nodes=None, sink=None, positions=None,
                     d = {k: cnt[k] for k in getattr(cnt, 'keys', lambda: [])()}
                 except Exception:
                     d = {}
-            print(f"Node {node_id} frwd_data_cnt: {d}")
+            if verbose:
+                logger.debug("Node %s frwd_data_cnt: %s", node_id, d)
             frwd_summary[node_id] = d
 
     # compute total count across all senders
@@ -375,7 +423,7 @@ def simulate_message_transmission(sensor_nodes=None, sink=None, positions=None,
         except Exception:
             continue
 
-    print(f"\nTotal frwd_data_cnt across all senders: {total_frwd}")
+    logger.info("\nTotal frwd_data_cnt across all senders: %s", total_frwd)
 
     return {
         'message': message,
@@ -0,0 +1,68 @@
+import numpy as np
+
+# Exponents applied to each factor of the IF score; all 1.0 reproduces
+# IF = pa * (E / ET(d_uv, L)) * (1 / d_vs^2)
+DEFAULT_WEIGHTS = {'energy': 1.0, 'distance': 1.0, 'path': 1.0}
+
+
+def score_relays(u_location, cand_locations, cand_energy, sink_location, in_path=None,
+                 L=100, lambda_val=2, weights=None, d_vs=None):
+    """
+    Vectorized IF score for every candidate relay of node u.
+
+    u_location:     (x, y) of the forwarding node
+    cand_locations: (n, 2) candidate positions
+    cand_energy:    (n,) residual energies
+    sink_location:  (x, y) of the sink
+    in_path:        (n,) bools, candidates already on message['path'] (pa = lambda_val)
+    d_vs:           optional (n,) distances to the sink (e.g. as reported by the
+                    candidates); computed from positions when omitted
+    weights:        dict of exponents for 'energy', 'distance', 'path'
+    Returns an (n,) float array of scores.
+    """
+    w = dict(DEFAULT_WEIGHTS)
+    if weights:
+        w.update(weights)
+    loc = np.asarray(cand_locations, dtype=float).reshape(-1, 2)
+    energy = np.asarray(cand_energy, dtype=float)
+    d_uv = np.hypot(loc[:, 0] - u_location[0], loc[:, 1] - u_location[1])
+    if d_vs is None:
+        d_vs = np.hypot(loc[:, 0] - sink_location[0], loc[:, 1] - sink_location[1])
+    d_vs = np.maximum(np.asarray(d_vs, dtype=float), 1e-6)
+
+    energy_term = energy / (d_uv * 0.1 + L * 0.01)   # E / ET(d_uv, L)
+    distance_term = 1.0 / (d_vs ** 2)
+    if in_path is None:
+        pa = np.ones_like(energy)
+    else:
+        pa = np.where(np.asarray(in_path, dtype=bool), float(lambda_val), 1.0)
+
+    score = energy_term if w['energy'] == 1.0 else energy_term ** w['energy']
+    score = score * (distance_term if w['distance'] == 1.0 else distance_term ** w['distance'])
+    return score * (pa if w['path'] == 1.0 else pa ** w['path'])
+
+
+def rank_relays(scores, k=None):
+    """
+    Indices of the k best scores, best first (all candidates when k is None).
+    Ties keep candidate order.
+    """
+    scores = np.asarray(scores, dtype=float)
+    n = scores.shape[0]
+    if k is None or k >= n:
+        return np.argsort(-scores, kind='stable')
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top.sort()
+    return top[np.argsort(-scores[top], kind='stable')]
+
+
+def node_energies(nodes, store=None):
+    """Residual energies for a list of nodes, read from the NodeStore when possible."""
+    if store is not None:
+        try:
+            return store.energy[store.slots(n.node_id for n in nodes)]
+        except KeyError:
+            pass
+    return np.array([getattr(n, 'initial_energy', 1.0) for n in nodes], dtype=float)
@@ -0,0 +1,72 @@
+import random
+from collections import Counter, defaultdict
+
+from Message_Transmission.event_scheduler import EventScheduler, default_scheduler
+
+
+def new_reputation():
+    # module level (not a lambda) so a context's reputation store can be pickled
+    return {'gamma': 1, 'k': 0, 'pv': 1.0}
+
+
+class SimulationContext:
+    """
+    Mutable state of one simulation: the sink's reputation store, the set of
+    suspicious node ids, per-run event counters, the RNG used for relay queries
+    and the virtual-clock scheduler.
+
+    Reputation changes are propagated as deltas: every update bumps the node's
+    entry in reputation_versions and marks it dirty; a broadcast publishes only
+    the dirty entries, at most once per broadcast_interval virtual seconds
+    (None = at the end of every hop).
+
+    Anomaly reports are buffered in anomaly_buffer, keyed by the offender's id
+    (count, location, TS range, reporters), and flushed as one batch per
+    reporter at the end of a hop or once per report_window virtual seconds.
+
+    Functions that touch this state take `context=None` and fall back to
+    `default_context`, so existing single-run code keeps working while
+    independent runs (threads, processes, repeated experiments) each pass their
+    own context and never see each other's suspicions or reputations.
+    """
+
+    def __init__(self, seed=None, rng=None, scheduler=None, broadcast_interval=None, report_window=None):
+        self.suspicious_nodes = set()
+        self.node_reputation = defaultdict(new_reputation)
+        self.reputation_versions = defaultdict(int)
+        self.reputation_dirty = set()
+        # last version each node has applied, as seen by the network
+        self.applied_versions = {}
+        self.broadcast_interval = broadcast_interval
+        self.last_broadcast = None
+        self.anomaly_buffer = {}
+        self.report_window = report_window
+        self.last_report_flush = None
+        self.counters = Counter()
+        self.rng = rng if rng is not None else random.Random(seed)
+        self.scheduler = scheduler if scheduler is not None else EventScheduler()
+
+    def count(self, event, n=1):
+        self.counters[event] += n
+
+    def reset(self):
+        """Clear suspicions, reputations and counters in place (aliases stay valid)."""
+        self.suspicious_nodes.clear()
+        self.node_reputation.clear()
+        self.reputation_versions.clear()
+        self.reputation_dirty.clear()
+        self.applied_versions.clear()
+        self.last_broadcast = None
+        self.anomaly_buffer.clear()
+        self.last_report_flush = None
+        self.counters.clear()
+
+
+# The process-wide context used when callers pass none. It draws from the global
+# `random` module (seeded by initialize_network) and the shared scheduler, so
+# seeded single runs behave as before.
+default_context = SimulationContext(rng=random, scheduler=default_scheduler)
+
+
+def get_context(context=None):
+    return default_context if context is None else context
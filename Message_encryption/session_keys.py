@@ -0,0 +1,114 @@
+import hmac
+import hashlib
+import time
+from collections import OrderedDict
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+# ---------------- Session-key cache ----------------
+# ecc_encrypt_key does an ECC keygen + ECDH + HKDF for every message. A session
+# runs that setup once per (source, sink) pair and derives each message's
+# keystream from the cached session key with a single HMAC over a counter.
+
+def _session_base_key(priv, pub):
+    shared = priv.exchange(ec.ECDH(), pub)
+    return HKDF(
+        algorithm=hashes.SHA256(),
+        length=32,
+        salt=None,
+        info=b'session key'
+    ).derive(shared)
+
+def _message_keystream(base_key, counter, length):
+    out = b''
+    block = 0
+    while len(out) < length:
+        msg = counter.to_bytes(8, 'big') + block.to_bytes(4, 'big')
+        out += hmac.new(base_key, msg, hashlib.sha256).digest()
+        block += 1
+    return out[:length]
+
+def _pub_id(pub):
+    return pub.public_bytes(serialization.Encoding.X962, serialization.PublicFormat.CompressedPoint)
+
+
+class SessionKeyCache:
+    """
+    Caches one ECC session per (source, sink) pair.
+
+    rekey_interval: number of messages after which a session is replaced
+    ttl:            seconds after which a session is replaced
+    max_sessions:   LRU bound on cached sessions (sender and receiver side)
+    """
+
+    def __init__(self, rekey_interval=1000, ttl=3600.0, max_sessions=256, clock=time.monotonic):
+        self.rekey_interval = rekey_interval
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.clock = clock
+        self._sessions = OrderedDict()    # (source, sink) -> session dict
+        self._base_keys = OrderedDict()   # public key bytes -> (base_key, created)
+
+    def _expired(self, created):
+        return self.ttl is not None and self.clock() - created > self.ttl
+
+    def _evict(self, table):
+        while len(table) > self.max_sessions:
+            table.popitem(last=False)
+
+    def session(self, source, sink):
+        """Return the live session for (source, sink), creating or rekeying it if needed."""
+        key = (source, sink)
+        session = self._sessions.get(key)
+        if session is not None and (self._expired(session["created"]) or
+                                    (self.rekey_interval and session["counter"] >= self.rekey_interval)):
+            self._base_keys.pop(session["pub_id"], None)
+            session = None
+        if session is None:
+            priv = ec.generate_private_key(ec.SECP256R1())
+            pub = priv.public_key()
+            session = {
+                "priv": priv,
+                "pub": pub,
+                "pub_id": _pub_id(pub),
+                "base_key": _session_base_key(priv, pub),
+                "created": self.clock(),
+                "counter": 0
+            }
+            self._sessions[key] = session
+            self._base_keys[session["pub_id"]] = (session["base_key"], session["created"])
+            self._evict(self._sessions)
+            self._evict(self._base_keys)
+        else:
+            self._sessions.move_to_end(key)
+        return session
+
+    def wrap(self, key: bytes, source, sink='sink'):
+        """
+        Session counterpart of ecc_encrypt_key.
+        Returns: enc_key, priv, pub, counter (counter is needed to unwrap).
+        """
+        session = self.session(source, sink)
+        session["counter"] += 1
+        counter = session["counter"]
+        keystream = _message_keystream(session["base_key"], counter, len(key))
+        enc_key = bytes(k ^ d for k, d in zip(key, keystream))
+        return enc_key, session["priv"], session["pub"], counter
+
+    def unwrap(self, enc_key: bytes, priv, pub, counter):
+        """Session counterpart of ecc_decrypt_key; the ECDH + HKDF runs once per session."""
+        pub_id = _pub_id(pub)
+        entry = self._base_keys.get(pub_id)
+        if entry is None or self._expired(entry[1]):
+            entry = (_session_base_key(priv, pub), self.clock())
+            self._base_keys[pub_id] = entry
+            self._evict(self._base_keys)
+        else:
+            self._base_keys.move_to_end(pub_id)
+        keystream = _message_keystream(entry[0], counter, len(enc_key))
+        return bytes(k ^ d for k, d in zip(enc_key, keystream))
+
+
+# shared cache used when a caller opts into sessions without supplying one
+default_session_cache = SessionKeyCache()
@@ -5,29 +5,39 @@ from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives import hashes
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 import random
+from itertools import combinations
+from Message_encryption.session_keys import default_session_cache
 
 # ---------------- AES helpers ----------------
 def generate_aes_key(length=16):
     return bytes(random.randint(0, 255) for _ in range(length))
 
+def int_to_bytes(message: int):
+    return message.to_bytes((message.bit_length() + 7) // 8 or 1, 'big')
+
+def aes_encrypt_bytes(data, key: bytes):
+    """Encrypt bytes-like data using AES-CBC. Returns: ct_bytes, iv"""
+    cipher = AES.new(key, AES.MODE_CBC)
+    ct_bytes = cipher.encrypt(pad(bytes(data), AES.block_size))
+    return ct_bytes, cipher.iv
+
+def aes_decrypt_bytes(ct_bytes, key: bytes, iv: bytes):
+    cipher = AES.new(key, AES.MODE_CBC, iv)
+    return unpad(cipher.decrypt(bytes(ct_bytes)), AES.block_size)
+
 def aes_encrypt_int(message: int, key: bytes):
     """
     Encrypt an integer message using AES-CBC.
     Returns: ct_int, iv, ct_len (ct_len = len(ct_bytes) so we can reconstruct exact bytes later)
     """
-    msg_bytes = message.to_bytes((message.bit_length() + 7) // 8 or 1, 'big')
-    cipher = AES.new(key, AES.MODE_CBC)
-    ct_bytes = cipher.encrypt(pad(msg_bytes, AES.block_size))
-    return int.from_bytes(ct_bytes, 'big'), cipher.iv, len(ct_bytes)
+    ct_bytes, iv = aes_encrypt_bytes(int_to_bytes(message), key)
+    return int.from_bytes(ct_bytes, 'big'), iv, len(ct_bytes)
 
 def aes_decrypt_int(ct_int: int, key: bytes, iv: bytes, ct_len: int):
     """
     Decrypt integer ciphertext using AES-CBC. ct_len is required to preserve leading zero bytes.
     """
-    ct_bytes = ct_int.to_bytes(ct_len, 'big')
-    cipher = AES.new(key, AES.MODE_CBC, iv)
-    pt_bytes = unpad(cipher.decrypt(ct_bytes), AES.block_size)
-    return int.from_bytes(pt_bytes, 'big')
+    return int.from_bytes(aes_decrypt_bytes(ct_int.to_bytes(ct_len, 'big'), key, iv), 'big')
 
 # ---------------- ECC helpers ----------------
 def ecc_encrypt_key(key: bytes):
@@ -76,18 +86,23 @@ def generate_B_matrix(t):
             B[i] = np.roll(gen, i)
         return B
 
-def intlist_to_bitmatrix(C):
+def words_per_part(part_bits):
+    """Number of uint64 words needed to hold part_bits bits."""
+    return max(1, (int(part_bits) + 63) // 64)
+
+def gf2_combine(M, W):
     """
-    Convert a list of integers C (each representing a part) into a bit-matrix
-    shape = (len(C), max_bits). Each row is the binary representation of that part,
-    left-to-right most-significant-bit first.
+    Multiply a 0/1 matrix M (r, t) by packed rows W (t, nwords) over GF(2):
+    output row i is the XOR of the word rows W[j] selected by M[i, j].
+    W may carry extra leading batch axes after t, e.g. (t, N, nwords).
     """
-    max_bits = max((c.bit_length() for c in C), default=1)
-    bit_matrix = np.zeros((len(C), max_bits), dtype=int)
-    for i, c in enumerate(C):
-        bits = list(map(int, bin(c)[2:].zfill(max_bits)))
-        bit_matrix[i] = bits
-    return bit_matrix
+    M = np.asarray(M) % 2
+    out = np.zeros((M.shape[0],) + W.shape[1:], dtype=np.uint64)
+    for j in range(M.shape[1]):
+        sel = M[:, j] == 1
+        if sel.any():
+            out[sel] ^= W[j]
+    return out
 
 def mod2_matrix_inverse(A):
     """
@@ -109,81 +124,116 @@ def mod2_matrix_inverse(A):
                 I[row] ^= I[col]
     return I % 2
 
-def reconstruct_C_bitwise(T_rows, chosen_shares_bits):
-    """
-    Reconstruct the original C bit-matrix given:
-      - T_rows: list/array of rows taken from B_ext (forming square transform T)
-      - chosen_shares_bits: list of share bit-arrays (each array is shape (num_bits,))
-    Returns C_rec: numpy array shape (t, max_bits) where t = original number of parts
-    (This is the same shape produced by intlist_to_bitmatrix(C)).
-    """
-    T = np.array(T_rows, dtype=int) % 2
-    T_inv = mod2_matrix_inverse(T)
-    max_bits = chosen_shares_bits[0].shape[0]
-    # T_inv.shape[1] == t (number of original parts)
-    C_rec = np.zeros((T_inv.shape[1], max_bits), dtype=int)
+# memoized GF(2) inverses: (t, recv_indices) for canonical B_ext, (t, T bytes) otherwise
+_T_INV_CACHE = {}
 
-    for bit in range(max_bits):
-        s_vec = np.array([row[bit] for row in chosen_shares_bits], dtype=int)
-        C_rec[:, bit] = T_inv.dot(s_vec) % 2
+def generate_B_ext(t):
+    """B_ext for t parts: generate_B_matrix(t) plus the XOR of its rows (t+1 rows)."""
+    B = generate_B_matrix(t)
+    return np.vstack([B, np.bitwise_xor.reduce(B, axis=0)])
 
-    return C_rec
+def _cached_inverse(key, T):
+    T_inv = _T_INV_CACHE.get(key)
+    if T_inv is None:
+        T_inv = mod2_matrix_inverse(T)
+        T_inv.setflags(write=False)
+        _T_INV_CACHE[key] = T_inv
+    return T_inv
 
-def split_message_to_parts(m: int, t: int):
+def get_T_inverse(B_ext, recv_indices):
+    """
+    GF(2) inverse of the rows of B_ext selected by recv_indices, memoized by
+    (t, recv_indices) since B_ext is fixed for a given t.
     """
-    Split integer m into t equal-length bit-parts (returned as integers).
+    B_ext = np.asarray(B_ext, dtype=int) % 2
+    t = B_ext.shape[1]
+    T = B_ext[list(recv_indices)]
+    if np.array_equal(B_ext, generate_B_ext(t)):
+        return _cached_inverse((t, tuple(int(i) for i in recv_indices)), T)
+    return _cached_inverse((t, T.tobytes()), T)
+
+def precompute_inverses(t):
+    """Fill the cache with T_inv for every invertible t-subset of the B_ext rows."""
+    B_ext = generate_B_ext(t)
+    for recv_indices in combinations(range(B_ext.shape[0]), t):
+        try:
+            get_T_inverse(B_ext, recv_indices)
+        except ValueError:
+            continue
+
+def reconstruct_C_words(B_ext, recv_indices, chosen_shares):
     """
-    bin_str = bin(m)[2:]
-    n = len(bin_str)
-    part_len = (n + t - 1) // t
-    bin_str = bin_str.zfill(part_len * t)
-    return [int(bin_str[i * part_len:(i + 1) * part_len], 2) for i in range(t)]
+    Reconstruct the packed part rows (t, nwords) from packed shares: one GF(2)
+    multiplication of the cached T_inv by the whole share word matrix.
+    """
+    T_inv = get_T_inverse(B_ext, recv_indices)
+    return gf2_combine(T_inv, np.vstack(chosen_shares).astype(np.uint64, copy=False))
+
+def part_bytes_for(total_len, t):
+    """Byte width of each part when total_len bytes are split into t parts."""
+    return max(1, (int(total_len) + t - 1) // t)
 
-def generate_shares_bitwise(C):
+def split_bytes_to_words(data, t):
+    """
+    Split bytes-like data (bytes / bytearray / memoryview) into t equal byte
+    parts, left-padding with zeros, and pack each part into a row of uint64
+    words (left-padded to whole words). Returns array shape (t, nwords).
     """
-    Given list C of t integer parts, create bitwise shares using B_ext (t+1 rows).
-    Returns B_ext and shares (list length t+1) where each share is a 1D bit-array.
+    buf = np.frombuffer(data, dtype=np.uint8)
+    part_bytes = part_bytes_for(buf.size, t)
+    row_bytes = 8 * words_per_part(8 * part_bytes)
+    rows = np.zeros((t, row_bytes), dtype=np.uint8)
+    padded = np.zeros(t * part_bytes, dtype=np.uint8)
+    padded[padded.size - buf.size:] = buf
+    rows[:, row_bytes - part_bytes:] = padded.reshape(t, part_bytes)
+    return rows.view(np.uint64)
+
+def merge_words_to_bytes(C_words, total_len):
+    """Inverse of split_bytes_to_words: concatenate the part bytes, drop the padding."""
+    C_words = np.ascontiguousarray(C_words, dtype=np.uint64)
+    t = C_words.shape[0]
+    part_bytes = part_bytes_for(total_len, t)
+    rows = C_words.view(np.uint8)
+    flat = rows[:, rows.shape[1] - part_bytes:].reshape(-1)
+    return flat[flat.size - total_len:].tobytes()
+
+def generate_shares_words(C_words):
     """
-    t = len(C)
-    C_bits = intlist_to_bitmatrix(C)  # shape (t, max_bits)
-    B = generate_B_matrix(t)          # shape (t, t)
-    b_t1 = np.bitwise_xor.reduce(B, axis=0)  # 1D array length t
-    B_ext = np.vstack([B, b_t1])      # shape (t+1, t)
-    shares = []
-
-    for i in range(t + 1):
-        row = B_ext[i]
-        s = np.zeros(C_bits.shape[1], dtype=int)
-        for j in range(t):
-            if row[j] == 1:
-                s ^= C_bits[j]
-        shares.append(s)
-
-    return B_ext, shares
-
-def generate_and_share(message: int, t: int):
+    Given packed part rows C_words (t, nwords), return B_ext and shares (list
+    length t+1), each share being the XOR of the rows selected by its B_ext row.
+    """
+    B_ext = generate_B_ext(C_words.shape[0])  # shape (t+1, t)
+    S = gf2_combine(B_ext, C_words)           # shape (t+1, nwords)
+    return B_ext, list(S)
+
+def generate_and_share(message: int, t: int, session_cache=None, source_id=None, sink_id='sink'):
     """
     Top-level function:
       - generate AES key
-      - encrypt message -> ct_int, iv, ct_len
+      - encrypt message -> ct_bytes, iv, ct_len
       - ecc-encrypt AES key -> enc_key (bytes), priv, pub
-      - split enc_key_int into t parts -> shares_key (t+1 shares)
-      - split ct_int into t parts -> shares_msg (t+1 shares)
+      - split enc_key into t byte parts -> shares_key (t+1 shares)
+      - split ct_bytes into t byte parts -> shares_msg (t+1 shares)
     Returns dictionary containing everything a receiver needs (except the original secret).
+    If session_cache (a SessionKeyCache) is given, the AES key is wrapped with the
+    cached (source_id, sink_id) session instead of a fresh ECC keypair, and the
+    result carries the "session_counter" needed to unwrap it.
     """
     aes_key = generate_aes_key()
-    ct_int, iv, ct_len = aes_encrypt_int(message, aes_key)
+    ct_bytes, iv = aes_encrypt_bytes(int_to_bytes(message), aes_key)
+    ct_len = len(ct_bytes)
 
-    enc_key, ecc_priv, ecc_pub = ecc_encrypt_key(aes_key)
-    enc_key_int = int.from_bytes(enc_key, 'big')
+    session_counter = None
+    if session_cache is not None:
+        enc_key, ecc_priv, ecc_pub, session_counter = session_cache.wrap(aes_key, source_id, sink_id)
+    else:
+        enc_key, ecc_priv, ecc_pub = ecc_encrypt_key(aes_key)
 
-    # Generate AES key shares
-    C_key = split_message_to_parts(enc_key_int, t)
-    B_key, shares_key = generate_shares_bitwise(C_key)
+    # Generate AES key shares (part size is derived from enc_key_len at the sink)
+    B_key, shares_key = generate_shares_words(split_bytes_to_words(enc_key, t))
 
     # Generate message shares
-    C_msg = split_message_to_parts(ct_int, t)
-    B_msg, shares_msg = generate_shares_bitwise(C_msg)
+    B_msg, shares_msg = generate_shares_words(split_bytes_to_words(ct_bytes, t))
 
     return {
         "shares_key": shares_key,
@@ -194,7 +244,8 @@ def generate_and_share(message: int, t: int):
         "ct_len": ct_len,            # ciphertext byte length (important!)
         "ecc_priv": ecc_priv,
         "ecc_pub": ecc_pub,
-        "iv": iv
+        "iv": iv,
+        "session_counter": session_counter
     }
 
 def reconstruct_and_decrypt(
@@ -207,41 +258,111 @@ def reconstruct_and_decrypt(
         ct_len,
         ecc_priv,
         ecc_pub,
-        iv):
+        iv,
+        session_counter=None,
+        session_cache=None):
     """
     Reconstruct AES key and ciphertext from selected shares and decrypt.
     recv_indices: list of indices chosen from the B_ext (length must equal t to form square T)
-    recv_key_shares: list of share-bit-arrays corresponding to recv_indices (len == len(recv_indices))
-    recv_msg_shares: list of share-bit-arrays corresponding to recv_indices (len == len(recv_indices))
+    recv_key_shares: list of shares corresponding to recv_indices (len == len(recv_indices))
+    recv_msg_shares: list of shares corresponding to recv_indices (len == len(recv_indices))
+    session_counter: set when the key was wrapped with a session (see generate_and_share);
+        unwrapped through session_cache (default: the shared default_session_cache)
     """
-
     # ---- AES KEY reconstruction ----
-    T_key = [B_key[i] for i in recv_indices]               # shape (t, t)
-    C_key_bits = reconstruct_C_bitwise(T_key, recv_key_shares)  # shape (t, bits)
-
-    # Each row in C_key_bits corresponds to one original part (MSB->LSB).
-    # Rebuild the original bitstring by concatenating rows in order.
-    key_bitstring = ''.join(''.join(str(bit) for bit in row) for row in C_key_bits)
-    if key_bitstring == '':
-        key_int = 0
-    else:
-        key_int = int(key_bitstring, 2)
-    enc_key = key_int.to_bytes(enc_key_len, 'big')
+    # cached T_inv for (t, recv_indices) times the packed share matrix
+    C_key_words = reconstruct_C_words(B_key, recv_indices, recv_key_shares)  # shape (t, nwords)
+    # Each row is one original byte part, in order: concatenate and drop padding.
+    enc_key = merge_words_to_bytes(C_key_words, enc_key_len)
 
-    aes_key = ecc_decrypt_key(enc_key, ecc_priv, ecc_pub)
+    if session_counter is not None:
+        aes_key = (session_cache or default_session_cache).unwrap(enc_key, ecc_priv, ecc_pub, session_counter)
+    else:
+        aes_key = ecc_decrypt_key(enc_key, ecc_priv, ecc_pub)
 
     # ---- MESSAGE reconstruction ----
-    T_msg = [B_msg[i] for i in recv_indices]
-    C_msg_bits = reconstruct_C_bitwise(T_msg, recv_msg_shares)
+    C_msg_words = reconstruct_C_words(B_msg, recv_indices, recv_msg_shares)
+    ct_bytes = merge_words_to_bytes(C_msg_words, ct_len)
 
-    # Reconstruct message bitstring by concatenating rows (parts) in original order.
-    msg_bitstring = ''.join(''.join(str(bit) for bit in row) for row in C_msg_bits)
-    if msg_bitstring == '':
-        msg_int = 0
-    else:
-        msg_int = int(msg_bitstring, 2)
+    recovered = int.from_bytes(aes_decrypt_bytes(ct_bytes, aes_key, iv), 'big')
+    return recovered
+
+def generate_and_share_batch(messages, t: int):
+    """
+    Share N messages at once. All messages use one AES key (wrapped once with
+    ecc_encrypt_key) with a fresh IV each, and one B_ext for t. Ciphertexts are
+    left-padded to a common part width and stacked, so each route's shares for
+    the whole batch come out of a single GF(2) combination.
+
+    messages: iterable of ints (as in generate_and_share) or bytes-like objects.
+    Returns a columnar dict:
+      shares_key: list of t+1 key shares (shared by the batch)
+      shares_msg: array (t+1, N, nwords); shares_msg[r] is route r's column
+      ct_lens:    array (N,) of ciphertext byte lengths
+      ivs:        list of N IVs
+      plus B_key, B_msg, enc_key_len, part_bytes, ecc_priv, ecc_pub
+    """
+    aes_key = generate_aes_key()
+    cts, ivs = [], []
+    for m in messages:
+        data = int_to_bytes(m) if isinstance(m, int) else m
+        ct_bytes, iv = aes_encrypt_bytes(data, aes_key)
+        cts.append(ct_bytes)
+        ivs.append(iv)
+    ct_lens = np.array([len(c) for c in cts], dtype=np.int64)
+    n = len(cts)
+
+    enc_key, ecc_priv, ecc_pub = ecc_encrypt_key(aes_key)
+    B_key, shares_key = generate_shares_words(split_bytes_to_words(enc_key, t))
+
+    # stack ciphertexts right-aligned into (N, t, part_bytes) -> uint64 words (t, N, nwords)
+    part_bytes = part_bytes_for(int(ct_lens.max()) if n else 1, t)
+    row_bytes = 8 * words_per_part(8 * part_bytes)
+    flat = np.zeros((n, t * part_bytes), dtype=np.uint8)
+    for i, c in enumerate(cts):
+        flat[i, flat.shape[1] - len(c):] = np.frombuffer(c, dtype=np.uint8)
+    rows = np.zeros((t, n, row_bytes), dtype=np.uint8)
+    rows[:, :, row_bytes - part_bytes:] = flat.reshape(n, t, part_bytes).transpose(1, 0, 2)
+    C_words = rows.view(np.uint64)
+
+    B_msg = generate_B_ext(t)
+    shares_msg = gf2_combine(B_msg, C_words)   # shape (t+1, N, nwords)
 
-    recovered = aes_decrypt_int(msg_int, aes_key, iv, ct_len)
+    return {
+        "shares_key": shares_key,
+        "shares_msg": shares_msg,
+        "B_key": B_key,
+        "B_msg": B_msg,
+        "enc_key_len": len(enc_key),
+        "ct_lens": ct_lens,
+        "part_bytes": part_bytes,
+        "ivs": ivs,
+        "ecc_priv": ecc_priv,
+        "ecc_pub": ecc_pub
+    }
+
+def reconstruct_and_decrypt_batch(recv_indices, data, as_int=True):
+    """
+    Inverse of generate_and_share_batch using the routes in recv_indices.
+    Returns the N plaintexts (ints if as_int, else bytes).
+    """
+    recv_key_shares = [data["shares_key"][i] for i in recv_indices]
+    C_key_words = reconstruct_C_words(data["B_key"], recv_indices, recv_key_shares)
+    aes_key = ecc_decrypt_key(merge_words_to_bytes(C_key_words, data["enc_key_len"]), data["ecc_priv"], data["ecc_pub"])
+
+    T_inv = get_T_inverse(data["B_msg"], recv_indices)
+    S = np.asarray(data["shares_msg"])[list(recv_indices)]   # (t, N, nwords)
+    C_words = gf2_combine(T_inv, S)
+    t, n = C_words.shape[0], C_words.shape[1]
+    part_bytes = data["part_bytes"]
+    rows = np.ascontiguousarray(C_words).view(np.uint8)      # (t, N, row_bytes)
+    flat = rows[:, :, rows.shape[2] - part_bytes:].transpose(1, 0, 2).reshape(n, t * part_bytes)
+
+    recovered = []
+    for i in range(n):
+        ct_len = int(data["ct_lens"][i])
+        pt = aes_decrypt_bytes(flat[i, flat.shape[1] - ct_len:].tobytes(), aes_key, data["ivs"][i])
+        recovered.append(int.from_bytes(pt, 'big') if as_int else pt)
     return recovered
 
 # ========== PART 1 ========== (example usage)
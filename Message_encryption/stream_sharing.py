@@ -0,0 +1,119 @@
+import os
+from Crypto.Cipher import AES
+from Message_encryption.share_generation import (
+    generate_aes_key, ecc_encrypt_key, ecc_decrypt_key,
+    split_bytes_to_words, merge_words_to_bytes, generate_shares_words, reconstruct_C_words,
+)
+
+# ---------------- Streaming LSDT sharing ----------------
+# Large payloads (sensor logs, image frames) are encrypted with AES-GCM one
+# chunk at a time and every chunk is split into t+1 shares as it is read, so
+# memory stays bounded by chunk_size instead of the payload size.
+# Each chunk has its own nonce (stream nonce || seq) and tag, so chunks can be
+# decrypted independently and in any order, and a tampered share, a reordered
+# seq or a forged final flag makes that chunk fail verification.
+
+def iter_chunks(source, chunk_size):
+    """
+    Yield bytes chunks of exactly chunk_size (the last may be shorter) from a
+    file-like object (anything with .read) or an iterable of bytes-like pieces.
+    """
+    if hasattr(source, 'read'):
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                return
+            yield bytes(chunk)
+    else:
+        buf = bytearray()
+        for piece in source:
+            buf += piece
+            while len(buf) >= chunk_size:
+                yield bytes(buf[:chunk_size])
+                del buf[:chunk_size]
+        if buf:
+            yield bytes(buf)
+
+def _chunk_cipher(aes_key, nonce, seq, final):
+    if not 0 <= seq < 2 ** 32:
+        raise ValueError(f"chunk seq {seq} out of range for a 32-bit nonce counter")
+    cipher = AES.new(aes_key, AES.MODE_GCM, nonce=nonce + seq.to_bytes(4, 'big'))
+    # the final flag is authenticated so a truncated stream is detectable
+    cipher.update(b'final' if final else b'chunk')
+    return cipher
+
+def _with_final(chunks):
+    """Yield (chunk, is_last) pairs, looking one chunk ahead."""
+    chunks = iter(chunks)
+    prev = next(chunks, None)
+    for chunk in chunks:
+        yield prev, False
+        prev = chunk
+    if prev is not None:
+        yield prev, True
+
+def generate_and_share_stream(source, t: int, chunk_size=4096):
+    """
+    Streaming counterpart of generate_and_share.
+
+    Yields first a header packet:
+        {"type": "header", "shares_key", "B_key", "enc_key_len", "ecc_priv",
+         "ecc_pub", "nonce", "chunk_size", "t"}
+    then one packet per chunk:
+        {"type": "chunk", "seq", "final", "chunk_len", "tag", "B_msg", "shares_msg"}
+    where shares_msg[r] is the share sent along route r (t+1 routes) and tag is
+    the chunk's GCM tag; "final" marks the last chunk of the stream.
+    chunk_size is rounded up to a multiple of the AES block size.
+    """
+    chunk_size = max(AES.block_size, -(-int(chunk_size) // AES.block_size) * AES.block_size)
+    aes_key = generate_aes_key()
+    nonce = os.urandom(8)  # + 4-byte seq = 96-bit GCM nonce per chunk
+
+    enc_key, ecc_priv, ecc_pub = ecc_encrypt_key(aes_key)
+    B_key, shares_key = generate_shares_words(split_bytes_to_words(enc_key, t))
+    yield {
+        "type": "header",
+        "shares_key": shares_key,
+        "B_key": B_key,
+        "enc_key_len": len(enc_key),
+        "ecc_priv": ecc_priv,
+        "ecc_pub": ecc_pub,
+        "nonce": nonce,
+        "chunk_size": chunk_size,
+        "t": t
+    }
+
+    for seq, (chunk, final) in enumerate(_with_final(iter_chunks(source, chunk_size))):
+        ct_chunk, tag = _chunk_cipher(aes_key, nonce, seq, final).encrypt_and_digest(chunk)
+        B_msg, shares_msg = generate_shares_words(split_bytes_to_words(ct_chunk, t))
+        yield {
+            "type": "chunk",
+            "seq": seq,
+            "final": final,
+            "chunk_len": len(ct_chunk),  # GCM: ciphertext length == plaintext length
+            "tag": tag,
+            "B_msg": B_msg,
+            "shares_msg": shares_msg
+        }
+
+def recover_stream_key(header, recv_indices):
+    """Rebuild the AES key from the header's key shares selected by recv_indices."""
+    recv_key_shares = [header["shares_key"][i] for i in recv_indices]
+    C_key_words = reconstruct_C_words(header["B_key"], recv_indices, recv_key_shares)
+    enc_key = merge_words_to_bytes(C_key_words, header["enc_key_len"])
+    return ecc_decrypt_key(enc_key, header["ecc_priv"], header["ecc_pub"])
+
+def reconstruct_stream(header, chunk_packets, recv_indices):
+    """
+    Yield (seq, plaintext_bytes) for each chunk packet, using the shares at
+    recv_indices (any t of the t+1 routes). Packets may arrive in any order.
+    Every chunk is verified against its GCM tag; a tampered share, seq or
+    final flag raises ValueError.
+    """
+    aes_key = recover_stream_key(header, recv_indices)
+    for packet in chunk_packets:
+        recv_msg_shares = [packet["shares_msg"][i] for i in recv_indices]
+        C_msg_words = reconstruct_C_words(packet["B_msg"], recv_indices, recv_msg_shares)
+        ct_chunk = merge_words_to_bytes(C_msg_words, packet["chunk_len"])
+        cipher = _chunk_cipher(aes_key, header["nonce"], packet["seq"], packet["final"])
+        yield packet["seq"], cipher.decrypt_and_verify(ct_chunk, packet["tag"])
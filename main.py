@@ -8,15 +8,24 @@ import base64
 from Message_encryption.share_generation import generate_and_share
 from Message_encryption.share_generation import reconstruct_and_decrypt
 from Message_Transmission.msgtrans import simulate_message_transmission
+from Message_Transmission.async_transmission import transmit_concurrently
 # from Message_Transmission.simulate import simulates
 import random
 # Optional: allow marking a node malicious for testing
 from Message_Transmission.malicious_node_management import mark_node_as_malicious
 from Message_Transmission import msgtrans
+from Initialization.sim_log import configure_logging
 
-# Toggle verbose diagnostics in the message transmission module (set True to see per-query prints)
+# Simulation log level: 'DEBUG', 'INFO', 'WARNING' or 'quiet' (no formatting at all)
+LOG_LEVEL = 'INFO'
+configure_logging(LOG_LEVEL)
+# Toggle verbose diagnostics in the message transmission module (set True to see per-query logs)
 VERBOSE_MSGTRANS = False
-msgtrans.DEBUG = VERBOSE_MSGTRANS
+msgtrans.set_debug(VERBOSE_MSGTRANS)
+# Send all shares concurrently on one asyncio event loop (virtual-clock TD waits) instead of one after another
+CONCURRENT_SHARES = False
+# Node snapshot format: 'csv' (node_metrics.csv), 'npy' (node_metrics_columnar) or 'parquet' (node_metrics.parquet); model.py reads any of them
+METRICS_FORMAT = 'csv'
 
 G, sensor_nodes, sink_node, positions, routing_table = initialize_network(num_nodes=30)
 print("Sink node:", sink_node.node_id)
@@ -173,17 +182,24 @@ indices = [0, 2, 3]
 recv_key = [data["shares_key"][i] for i in indices]
 recv_msg = [data["shares_msg"][i] for i in indices]
 
-for i in range(DESIRED_TOTAL_SHARES):
-    print(f"\n================== Transmitting share {i + 1} ==================")
-    # pass the initialized network so energy changes persist across shares
-    result = simulate_message_transmission(sensor_nodes=sensor_nodes, sink=sink_node, positions=positions)
-    print("\n--- Simulation Complete ---")
-    print("Message transmission path:", result['message']['path*'])
-    
-    print("Total hops:", result['message']['total_hops'])
-
-    color = (random.random(), random.random(), random.random())  # RGB
-    # simulates(result['message']['path*'], result['sink'], result['all_nodes'], delay=1.5, color=color, share_number=i+1)
+if CONCURRENT_SHARES:
+    share_messages = [{'id': f'm1-share{i + 1}', 'path*': [source_id]} for i in range(DESIRED_TOTAL_SHARES)]
+    for i, result in enumerate(transmit_concurrently(sensor_nodes, sink_node, share_messages, TD=1.0)):
+        print(f"\n================== Share {i + 1} ==================")
+        print("Message transmission path:", result['message']['path*'])
+        print("Total hops:", result['message']['total_hops'])
+else:
+    for i in range(DESIRED_TOTAL_SHARES):
+        print(f"\n================== Transmitting share {i + 1} ==================")
+        # pass the initialized network so energy changes persist across shares
+        result = simulate_message_transmission(sensor_nodes=sensor_nodes, sink=sink_node, positions=positions, metrics_format=METRICS_FORMAT)
+        print("\n--- Simulation Complete ---")
+        print("Message transmission path:", result['message']['path*'])
+
+        print("Total hops:", result['message']['total_hops'])
+
+        color = (random.random(), random.random(), random.random())  # RGB
+        # simulates(result['message']['path*'], result['sink'], result['all_nodes'], delay=1.5, color=color, share_number=i+1)
 
 # ========== PART 2 ==========
 original = reconstruct_and_decrypt(
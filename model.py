@@ -3,6 +3,7 @@
 # --------------------------------------------
 # 1. Import Libraries
 # --------------------------------------------
+import os
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
@@ -19,7 +20,15 @@ from sklearn.metrics import (
 # --------------------------------------------
 # 2. Load Dataset
 # --------------------------------------------
-df = pd.read_csv("node_metrics.csv")   # <-- replace with your file name
+# Prefer the columnar snapshot output (ColumnarMetricsWriter) when present:
+# typed, memory-mapped columns instead of re-parsing the CSV
+columnar_path = next((p for p in ("node_metrics_columnar", "node_metrics.parquet") if os.path.exists(p)), None)
+if columnar_path is not None:
+    from Message_Transmission.columnar_metrics import load_columns
+    # keep the same feature columns as the CSV snapshots
+    df = pd.DataFrame(load_columns(columnar_path)).drop(columns=["run_id", "hop", "is_malicious"])
+else:
+    df = pd.read_csv("node_metrics.csv")   # <-- replace with your file name
 
 # Use only numeric columns
 df_numeric = df.select_dtypes(include=np.number).dropna()